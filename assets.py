@@ -0,0 +1,96 @@
+import os
+import json
+import threading
+
+import pygame
+
+# Startup helpers.
+# pygame.font.SysFont scans every installed font (through fc-list on Linux)
+# the first time it is used; the file it picks is cached on disk so later
+# launches open the font directly. Slow loads (sounds, the mixer) run on a
+# background thread while the game is already on screen.
+
+CACHE_DIR = os.environ.get("PROMPT_RUNNER_CACHE",
+                           os.path.join(os.path.expanduser("~"), ".cache", "prompt_runner"))
+FONT_CACHE_FILE = os.path.join(CACHE_DIR, "fonts.json")
+
+_font_paths = None
+
+def _read_font_cache():
+    try:
+        with open(FONT_CACHE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_font_cache(paths):
+    # The cache is only a shortcut, so failing to write it is not an error
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_file = FONT_CACHE_FILE + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(paths, f, indent=2)
+        os.replace(temp_file, FONT_CACHE_FILE)
+    except OSError:
+        pass
+
+def font_path(name):
+    # File of the system font `name`, or None for pygame's default font
+    # (the same fallback SysFont uses). Delete the cache file to rescan.
+    global _font_paths
+    if _font_paths is None:
+        _font_paths = _read_font_cache()
+
+    key = name.lower()
+    if key in _font_paths:
+        path = _font_paths[key]
+        if path is None or os.path.exists(path):
+            return path
+
+    path = pygame.font.match_font(name)
+    _font_paths[key] = path
+    _write_font_cache(_font_paths)
+    return path
+
+def load_font(name, size):
+    # Same font as pygame.font.SysFont(name, size)
+    return pygame.font.Font(font_path(name), size)
+
+class AssetLoader:
+    # Runs loading jobs in order on a background thread. Each result shows up
+    # in `assets` as soon as its job finishes; until then (or if the job
+    # failed) get() returns the default, so callers must cope without it.
+    def __init__(self):
+        self.jobs = []
+        self.assets = {}
+        self.failed = {}
+        self.thread = None
+
+    def add(self, name, load, *args):
+        self.jobs.append((name, load, args))
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="asset-loader", daemon=True)
+            self.thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    @property
+    def loaded(self):
+        return self.thread is not None and not self.thread.is_alive()
+
+    def get(self, name, default=None):
+        return self.assets.get(name, default)
+
+    def _run(self):
+        for name, load, args in self.jobs:
+            try:
+                self.assets[name] = load(*args)
+            except Exception as error:
+                # Any error only loses this asset; the other jobs still run
+                self.failed[name] = error
+                print(f"Could not load {name}: {type(error).__name__}: {error}")
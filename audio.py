@@ -0,0 +1,188 @@
+import os
+import time
+import wave
+
+import numpy as np
+import pygame
+
+from assets import CACHE_DIR
+
+# Sound effects.
+# Each category of sound gets its own channels, reserved so nothing else can
+# take them. A burst of collections can then never use up the mixer: when a
+# category's channels are all busy, its oldest sound is cut off for the new
+# one (voice stealing), and sounds that come too soon after the last one of
+# their category are dropped.
+#
+# WAV files in `sounds/` are used when they exist. Missing sounds are
+# synthesized with NumPy instead and saved in the cache directory, so only
+# the first launch has to build them.
+
+SOUND_DIR = "sounds"
+SOUND_CACHE_DIR = os.path.join(CACHE_DIR, "sounds")
+SYNTH_VERSION = 1  # bump when the synthesized sounds change, to rebuild the cache
+
+# Sound name: category
+SOUNDS = {
+    "jump": "jump",
+    "good_collect": "collect",
+    "bad_collect": "collect",
+    "game_over": "game_over",
+}
+
+# Category: (channels reserved, shortest time in seconds between two starts)
+CATEGORIES = {
+    "jump": (2, 0.05),
+    "collect": (4, 0.03),
+    "game_over": (1, 0.5),
+}
+
+SYNTH_VOLUME = 0.4
+
+def envelope(length, rate, attack=0.005):
+    # Short linear fade in, then an exponential decay to silence at the end
+    attack = max(min(int(rate * attack), length), 1)
+    shape = np.exp(np.linspace(0.0, -5.0, length))
+    shape[:attack] *= np.linspace(0.0, 1.0, attack)
+    return shape
+
+def tone(rate, duration, start_hz, end_hz=None, square=False):
+    # A note sliding linearly from `start_hz` to `end_hz`
+    length = int(rate * duration)
+    frequency = np.linspace(start_hz, start_hz if end_hz is None else end_hz, length)
+    signal = np.sin(2 * np.pi * np.cumsum(frequency) / rate)
+    if square:
+        signal = np.sign(signal) * 0.5  # square waves sound much louder
+    return signal * envelope(length, rate)
+
+def synthesize(name, rate):
+    # Mono samples in [-1, 1] for one of SOUNDS
+    if name == "jump":
+        samples = tone(rate, 0.15, 300, 700)
+    elif name == "good_collect":
+        samples = np.concatenate((tone(rate, 0.07, 660), tone(rate, 0.12, 990)))
+    elif name == "bad_collect":
+        samples = tone(rate, 0.25, 220, 110, square=True)
+    elif name == "game_over":
+        samples = np.concatenate([tone(rate, 0.18, hz) for hz in (440, 370, 294)]
+                                 + [tone(rate, 0.45, 220, 196)])
+    else:
+        raise ValueError(f"no recipe for sound {name!r}")
+    return samples * SYNTH_VOLUME
+
+def mixer_array(samples):
+    # Float samples to an array in the mixer's sample format and channel count
+    _, size, channels = pygame.mixer.get_init()
+    bits = abs(size)
+    if bits == 32:
+        array = samples.astype(np.float32)
+    else:
+        peak = 2 ** (bits - 1) - 1
+        array = np.round(samples * peak)
+        if size > 0:
+            array += peak + 1  # unsigned samples are centred on half their range
+        array = array.astype(f"{'i' if size < 0 else 'u'}{bits // 8}")
+    if channels > 1:
+        array = np.repeat(array[:, np.newaxis], channels, axis=1)
+    return array
+
+def cache_file(name, rate):
+    return os.path.join(SOUND_CACHE_DIR, f"{name}-v{SYNTH_VERSION}-{rate}.wav")
+
+def write_wav(path, samples, rate):
+    # 16-bit mono; the cache is only a shortcut, so failing to write it is not an error
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = path + ".tmp"
+        with wave.open(temp_file, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(rate)
+            f.writeframes(np.round(samples * 32767).astype("<i2").tobytes())
+        os.replace(temp_file, path)
+    except OSError:
+        pass
+
+def load_sound(name):
+    # The WAV in SOUND_DIR, else the cached synthesized sound, else a newly
+    # synthesized one (saved to the cache). Needs an initialized mixer.
+    path = os.path.join(SOUND_DIR, name + ".wav")
+    if os.path.exists(path):
+        return pygame.mixer.Sound(path)
+    rate = pygame.mixer.get_init()[0]
+    path = cache_file(name, rate)
+    if os.path.exists(path):
+        try:
+            return pygame.mixer.Sound(path)
+        except pygame.error:
+            pass  # damaged cache file; build the sound again
+    samples = synthesize(name, rate)
+    write_wav(path, samples, rate)
+    return pygame.sndarray.make_sound(mixer_array(samples))
+
+class ChannelPool:
+    __slots__ = ("channels", "started", "min_gap", "last_start", "played", "stolen", "limited")
+
+    def __init__(self, channels, min_gap):
+        self.channels = channels
+        self.started = [float("-inf")] * len(channels)  # when each channel's sound started
+        self.min_gap = min_gap
+        self.last_start = float("-inf")
+        self.played = 0
+        self.stolen = 0   # sounds cut off to make room for a new one
+        self.limited = 0  # sounds dropped for coming too soon
+
+    def play(self, sound, now):
+        if now - self.last_start < self.min_gap:
+            self.limited += 1
+            return None
+        started = self.started
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                break
+        else:
+            index = started.index(min(started))
+            self.stolen += 1
+        channel = self.channels[index]
+        channel.play(sound)
+        started[index] = self.last_start = now
+        self.played += 1
+        return channel
+
+class AudioManager:
+    # play() may be called from any thread (sounds are triggered on the
+    # simulation thread in --threaded mode); SDL locks the mixer itself.
+    def __init__(self, sounds, categories=CATEGORIES, clock=time.perf_counter):
+        self.sounds = sounds  # name -> pygame.mixer.Sound
+        self.clock = clock
+        reserved = sum(count for count, _ in categories.values())
+        # The pools take channels 0..reserved-1, which Sound.play() never picks;
+        # the mixer's own channels stay free for everything else
+        pygame.mixer.set_num_channels(pygame.mixer.get_num_channels() + reserved)
+        pygame.mixer.set_reserved(reserved)
+        self.pools = {}
+        first = 0
+        for category, (count, min_gap) in categories.items():
+            channels = [pygame.mixer.Channel(first + i) for i in range(count)]
+            self.pools[category] = ChannelPool(channels, min_gap)
+            first += count
+
+    @classmethod
+    def load(cls, names=SOUNDS):
+        # Opens the mixer and loads or synthesizes every sound; slow on the
+        # first launch, so run it on the asset loader thread
+        pygame.mixer.init()
+        return cls({name: load_sound(name) for name in names})
+
+    def play(self, name):
+        # Returns the channel the sound started on, or None if it was dropped
+        sound = self.sounds.get(name)
+        if sound is None:
+            return None
+        return self.pools[SOUNDS[name]].play(sound, self.clock())
+
+    def stats(self):
+        # (played, stolen, dropped) summed over all categories
+        pools = self.pools.values()
+        return (sum(pool.played for pool in pools), sum(pool.stolen for pool in pools),
+                sum(pool.limited for pool in pools))
@@ -0,0 +1,278 @@
+import random
+
+import numpy as np
+
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, GROUND_HEIGHT,
+    GRAVITY, JUMP_FORCE, PROMPT_SPEED, PROMPT_SPAWN_RATE, GAME_SPEED_INCREASE,
+    PROMPT_WIDTH, PROMPT_HEIGHT, GOOD_TEXTS, BAD_TEXTS,
+    Player,
+)
+
+# Vectorized batch simulator.
+# Runs many games in lockstep as NumPy arrays, one row per game, for
+# parameter sweeps. It follows the GameSimulation rules for play (dt = 1)
+# operation for operation, so every game ends with the same score on the
+# same tick as GameSimulation with the same seed and inputs. Only gameplay
+# is simulated: no menu, clouds or particles.
+#
+# rng="python" draws each game's spawns from random.Random(seed) exactly like
+# GameSimulation (one Python call per spawned prompt). rng="numpy" draws
+# them from one NumPy generator instead: same rules and distributions,
+# fully vectorized, but not comparable game-by-game with the scalar engine.
+
+PLAYER_X = Player().x
+PLAYER_WIDTH = Player().width
+PLAYER_HEIGHT = Player().height
+GROUND_Y = SCREEN_HEIGHT - GROUND_HEIGHT - PLAYER_HEIGHT
+PROMPT_MIN_Y = 100
+PROMPT_MAX_Y = SCREEN_HEIGHT - GROUND_HEIGHT - 100
+
+PROMPT_CAPACITY = 8  # prompt slots per game; a few are on screen at any speed
+
+def _per_game(value, games, dtype=np.float64):
+    return np.broadcast_to(np.asarray(value, dtype=dtype), (games,)).copy()
+
+def _sweep_interval(a_min, a_size, b_min, b_size, velocity):
+    # Vectorized collision._sweep_interval; returns (enter, leave) arrays
+    moving = velocity != 0
+    safe = np.where(moving, velocity, 1)
+    t1 = (a_min - b_min - b_size) / safe
+    t2 = (a_min + a_size - b_min) / safe
+    enter = np.minimum(t1, t2)
+    leave = np.maximum(t1, t2)
+
+    # Not moving on this axis: overlapping for all t, or never
+    overlap = (b_min < a_min + a_size) & (a_min < b_min + b_size)
+    enter = np.where(moving, enter, np.where(overlap, -np.inf, np.inf))
+    leave = np.where(moving, leave, np.where(overlap, np.inf, -np.inf))
+    return enter, leave
+
+# Per-game arrays that only hold the games still being played
+ROW_FIELDS = ("ids", "spawn_rate", "speed_increase", "gravity", "jump_force",
+              "y", "prev_y", "vel_y", "jumping", "game_speed", "spawn_counter",
+              "prompt_x", "prompt_prev_x", "prompt_y", "prompt_good", "active")
+
+class BatchSimulation:
+    # Parameters may be scalars or one value per game. Row arrays only hold
+    # the games still alive (`ids` maps rows to games); finished games are
+    # dropped so they cost nothing. `score`, `alive` and `death_tick` are
+    # indexed by game.
+    def __init__(self, seeds, rng="python", capacity=PROMPT_CAPACITY,
+                 spawn_rate=PROMPT_SPAWN_RATE, speed_increase=GAME_SPEED_INCREASE,
+                 gravity=GRAVITY, jump_force=JUMP_FORCE):
+        seeds = list(seeds)
+        games = len(seeds)
+        self.games = games
+        self.seeds = seeds
+        self.capacity = capacity
+
+        if rng == "python":
+            self.rngs = [random.Random(seed) for seed in seeds]
+            self.generator = None
+        elif rng == "numpy":
+            self.rngs = None
+            self.generator = np.random.default_rng(seeds[0] if seeds else None)
+        else:
+            raise ValueError(f"unknown rng {rng!r}")
+
+        # Results, per game
+        self.score = np.zeros(games, dtype=np.int64)
+        self.alive = np.ones(games, dtype=bool)
+        self.death_tick = np.full(games, -1, dtype=np.int64)
+        self.tick = 0
+
+        # Parameters, per row
+        self.ids = np.arange(games)
+        self.spawn_rate = _per_game(spawn_rate, games)
+        self.speed_increase = _per_game(speed_increase, games)
+        self.gravity = _per_game(gravity, games)
+        self.jump_force = _per_game(jump_force, games)
+
+        # Players
+        self.y = np.full(games, float(GROUND_Y))
+        self.prev_y = self.y.copy()
+        self.vel_y = np.zeros(games)
+        self.jumping = np.zeros(games, dtype=bool)
+        self.game_speed = np.ones(games)
+        self.spawn_counter = np.zeros(games, dtype=np.int64)
+
+        # Prompt slots; free slots have active == False
+        self.prompt_x = np.zeros((games, capacity))
+        self.prompt_prev_x = np.zeros((games, capacity))
+        self.prompt_y = np.zeros((games, capacity), dtype=np.int64)
+        self.prompt_good = np.zeros((games, capacity), dtype=bool)
+        self.active = np.zeros((games, capacity), dtype=bool)
+
+    def step(self, jump=None):
+        # One tick of every game still alive. `jump` is an optional bool array
+        # (indexed by game) of games pressing jump this tick. The first step
+        # corresponds to the GameSimulation step that started the game.
+        if not len(self.ids):
+            return
+        self.tick += 1
+
+        # Jump input
+        if jump is not None:
+            start = jump[self.ids] & ~self.jumping
+            self.vel_y = np.where(start, self.jump_force, self.vel_y)
+            self.jumping |= start
+
+        # Update game speed
+        self.game_speed = game_speed = self.game_speed + self.speed_increase
+
+        # Update players, as Player.update
+        vel_y = self.vel_y + self.gravity
+        y = self.y + vel_y
+        landed = y > GROUND_Y
+        self.prev_y = self.y
+        self.y = np.where(landed, float(GROUND_Y), y)
+        self.vel_y = np.where(landed, 0.0, vel_y)
+        self.jumping &= ~landed
+
+        # Spawn prompts
+        self.spawn_counter += 1
+        spawn = self.spawn_counter >= self.spawn_rate / game_speed
+        if spawn.any():
+            self.spawn_counter[spawn] = 0
+            self._spawn(np.flatnonzero(spawn))
+
+        # Update prompts (free slots move too; they are never read)
+        self.prompt_prev_x = self.prompt_x
+        self.prompt_x = x = self.prompt_x - (PROMPT_SPEED * game_speed)[:, None]
+
+        # Swept collisions, as collision.swept_collision, for the prompts
+        # whose path this step comes within a pixel of the player
+        rows, slots = np.nonzero(self.active & (x - 1 < PLAYER_X + PLAYER_WIDTH) &
+                                 (self.prompt_prev_x + PROMPT_WIDTH + 1 > PLAYER_X))
+        if len(rows):
+            hit = self._collisions(rows, slots)
+            rows, slots = rows[hit], slots[hit]
+        if len(rows):
+            good = self.prompt_good[rows, slots]
+            np.add.at(self.score, self.ids[rows[good]], 10)
+            self.active[rows, slots] = False
+            died = np.unique(rows[~good])
+            if len(died):
+                self.alive[self.ids[died]] = False
+                self.death_tick[self.ids[died]] = self.tick
+                keep = np.ones(len(self.ids), dtype=bool)
+                keep[died] = False
+                for field in ROW_FIELDS:
+                    setattr(self, field, getattr(self, field)[keep])
+                x = self.prompt_x
+
+        # Remove prompts that are off-screen
+        self.active &= x + PROMPT_WIDTH >= 0
+
+    def _spawn(self, rows):
+        slots = np.argmin(self.active[rows], axis=1)
+        if self.active[rows, slots].any():
+            raise RuntimeError("prompt buffer full; raise `capacity`")
+
+        if self.rngs is not None:
+            # Same calls, in the same order, as GameSimulation and Prompt.reset
+            count = len(rows)
+            is_good = np.empty(count, dtype=bool)
+            ys = np.empty(count, dtype=np.int64)
+            rngs = self.rngs
+            for i, game in enumerate(self.ids[rows].tolist()):
+                rng = rngs[game]
+                good = rng.choice([True, False])
+                is_good[i] = good
+                ys[i] = rng.randint(PROMPT_MIN_Y, PROMPT_MAX_Y)
+                rng.choice(GOOD_TEXTS if good else BAD_TEXTS)
+                rng.uniform(-2, 2)
+        else:
+            is_good = self.generator.random(len(rows)) < 0.5
+            ys = self.generator.integers(PROMPT_MIN_Y, PROMPT_MAX_Y + 1, len(rows))
+
+        # Spawned at x = SCREEN_WIDTH + 0 * speed, exactly as the scalar engine
+        self.prompt_x[rows, slots] = SCREEN_WIDTH + 0.0
+        self.prompt_y[rows, slots] = ys
+        self.prompt_good[rows, slots] = is_good
+        self.active[rows, slots] = True
+
+    def _collisions(self, rows, slots):
+        # Pixel overlap at the end of the step, plus prompts that passed
+        # through the player within it; coordinates truncated like int()
+        py = np.trunc(self.y[rows])
+        prev_y = np.trunc(self.prev_y[rows])
+        qx = np.trunc(self.prompt_x[rows, slots])
+        prev_x = np.trunc(self.prompt_prev_x[rows, slots])
+        qy = self.prompt_y[rows, slots]
+
+        overlap = ((PLAYER_X < qx + PROMPT_WIDTH) & (qx < PLAYER_X + PLAYER_WIDTH) &
+                   (py < qy + PROMPT_HEIGHT) & (qy < py + PLAYER_HEIGHT))
+
+        enter_x, leave_x = _sweep_interval(PLAYER_X, PLAYER_WIDTH, prev_x, PROMPT_WIDTH,
+                                           qx - prev_x)
+        enter_y, leave_y = _sweep_interval(prev_y, PLAYER_HEIGHT, qy, PROMPT_HEIGHT,
+                                           prev_y - py)
+        enter = np.maximum(enter_x, enter_y)
+        leave = np.minimum(leave_x, leave_y)
+        return overlap | ((enter < leave) & (enter < 1.0) & (leave > 0.0))
+
+    def run(self, ticks, jump_every=0):
+        # Steps up to `ticks` ticks (stopping early once every game is over)
+        # with the trivial bot from simulation.run_headless: jump every
+        # `jump_every` ticks
+        jump_all = np.ones(self.games, dtype=bool)
+        for _ in range(ticks):
+            if not len(self.ids):
+                break
+            jump = jump_all if jump_every and self.tick % jump_every == 0 and self.tick else None
+            self.step(jump)
+
+def scalar_outcomes(seeds, ticks, jump_every=0):
+    # (score, death tick or -1) per seed from GameSimulation, with the same
+    # inputs as BatchSimulation.run, for checking the batch engine
+    from simulation import GameSimulation, ACTION_JUMP, ACTION_START, GAME_OVER
+
+    outcomes = []
+    for seed in seeds:
+        sim = GameSimulation(seed=seed, effects=False)
+        result = sim.step([ACTION_START])
+        while result.state != GAME_OVER and result.frame < ticks:
+            jump = jump_every and result.frame % jump_every == 0
+            result = sim.step([ACTION_JUMP] if jump else ())
+        outcomes.append((result.score, result.frame if result.state == GAME_OVER else -1))
+    return outcomes
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Run many Prompt Runner games in lockstep")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0, help="first game's seed")
+    parser.add_argument("--jump-every", type=int, default=45)
+    parser.add_argument("--rng", choices=("python", "numpy"), default="python")
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="check the first N games against GameSimulation")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.games)
+    batch = BatchSimulation(seeds, rng=args.rng)
+    start = time.perf_counter()
+    batch.run(args.ticks, args.jump_every)
+    elapsed = time.perf_counter() - start
+
+    # Game-ticks actually simulated (games stop at their death tick)
+    frames = int(np.where(batch.alive, batch.tick, batch.death_tick).sum())
+    print(f"{args.games} games, {frames:,} game ticks in {elapsed:.2f} s "
+          f"({frames / elapsed:,.0f} ticks/s)")
+    print(f"Score: mean {batch.score.mean():.1f}, best {batch.score.max()}; "
+          f"{int(batch.alive.sum())} still alive after {batch.tick} ticks")
+
+    if args.verify:
+        expected = scalar_outcomes(list(seeds)[:args.verify], args.ticks, args.jump_every)
+        actual = [(int(batch.score[i]), int(batch.death_tick[i])) for i in range(args.verify)]
+        mismatches = [i for i in range(args.verify) if expected[i] != actual[i]]
+        if mismatches:
+            i = mismatches[0]
+            print(f"MISMATCH in {len(mismatches)} of {args.verify} games; "
+                  f"seed {seeds[i]}: batch {actual[i]}, scalar {expected[i]}")
+            raise SystemExit(1)
+        print(f"First {args.verify} games match GameSimulation exactly")
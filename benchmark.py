@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+
+# Headless rendering benchmark.
+# Plays scripted scenarios through the real enhanced_game renderer with SDL's
+# dummy video driver and records how long each part of every frame takes.
+# Results can be saved as a baseline and later runs compared against it, so a
+# change that makes any scenario slower fails loudly instead of going unseen.
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+import enhanced_game as game
+from simulation import (
+    SCREEN_WIDTH,
+    PLAYING, GAME_OVER,
+    ACTION_JUMP, ACTION_START,
+    GameSimulation,
+)
+from dirty_rects import DirtyRectRenderer
+from particles import ParticleSystem
+from profiling import PhaseTimer
+from pools import GCMonitor
+
+BASELINE_FILE = "benchmark_baseline.json"
+
+# A metric regresses when it is slower than the baseline by more than the
+# relative tolerance AND by more than the absolute slack (timer noise on
+# phases that only take a few microseconds)
+DEFAULT_TOLERANCE = 0.25
+ABSOLUTE_SLACK_MS = 0.25
+
+JUMP_EVERY = 45
+STORM_PARTICLES = 400  # emitted every frame of the particle storm
+CROWD_PROMPTS = 300    # prompts kept on screen in the crowd scenario
+
+# Live particle counts timed by --particles, and the share of a 60 FPS frame
+# the particle draw may take
+PARTICLE_COUNTS = (5000, 10000, 15000, 20000, 30000, 50000)
+PARTICLE_BUDGET_MS = 8.0
+
+class Scenario:
+    # `setup(sim, rng)` prepares the simulation; `inputs(sim, rng, frame)`
+    # scripts each frame and returns the actions for it
+    def __init__(self, name, setup, inputs):
+        self.name = name
+        self.setup = setup
+        self.inputs = inputs
+
+def start_playing(sim, rng):
+    sim.step([ACTION_START])
+
+def start_fast(sim, rng):
+    sim.step([ACTION_START])
+    sim.game_speed = 6.0
+
+def no_inputs(sim, rng, frame):
+    return ()
+
+def jump_regularly(sim, rng, frame):
+    return (ACTION_JUMP,) if frame % JUMP_EVERY == 0 else ()
+
+def particle_storm(sim, rng, frame):
+    for _ in range(STORM_PARTICLES // 20):
+        sim.particles.emit(rng.uniform(0, SCREEN_WIDTH), rng.uniform(100, 450),
+                           rng.random() < 0.5, 20)
+    return jump_regularly(sim, rng, frame)
+
+def prompt_crowd(sim, rng, frame):
+    # Keep the screen packed, appending on the right so the list stays sorted
+    prompts = sim.prompts
+    while len(prompts) < CROWD_PROMPTS:
+        x = max(prompts[-1].x + 3, SCREEN_WIDTH) if prompts else SCREEN_WIDTH
+        prompts.append(sim.prompt_pool.acquire(x, rng.random() < 0.5, rng))
+    return jump_regularly(sim, rng, frame)
+
+SCENARIOS = [
+    Scenario("menu", lambda sim, rng: None, no_inputs),
+    Scenario("play", start_playing, jump_regularly),
+    Scenario("high_speed", start_fast, jump_regularly),
+    Scenario("particle_storm", start_playing, particle_storm),
+    Scenario("prompt_crowd", start_playing, prompt_crowd),
+]
+
+def run_scenario(scenario, frames=600, warmup=60, seed=0, dirty_rects=False):
+    sim = GameSimulation(seed=seed)
+    rng = random.Random(seed)
+    background = game.Background(sim.clouds)
+    dirty = (DirtyRectRenderer(background.freeze(sim.cloud_scroll, sim.ground_scroll),
+                               display=game.display) if dirty_rects else None)
+    timer = PhaseTimer()
+    sim.timer = timer
+    scenario.setup(sim, rng)
+
+    for frame in range(warmup + frames):
+        if frame == warmup:
+            timer.clear()
+            sim.gc_monitor = GCMonitor().install()
+        timer.begin_frame()
+        result = sim.step(scenario.inputs(sim, rng, frame))
+        if result.state == GAME_OVER:
+            # Play through bad prompts so the load stays the same all run
+            sim.state = PLAYING
+        if sim.state == PLAYING:
+            game.show_playing(sim, result, background, dirty, timer=timer)
+        else:
+            game.show_menu(sim, background, timer=timer)
+        pygame.event.pump()
+        timer.end_frame()
+
+    sim.gc_monitor.uninstall()
+    summary = timer.summary()
+    summary["entities"] = sim.stats()
+    return summary
+
+def run_all(names=None, frames=600, warmup=60, seed=0, dirty_rects=False,
+            window_size=None, scale_mode=game.FIT, smooth=False):
+    # With `window_size` the game is scaled to a window of that size
+    game.init(window_size, scale_mode=scale_mode, smooth=smooth)
+    game.assets.wait()
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "frames": frames,
+            "seed": seed,
+            "dirty_rects": dirty_rects,
+            "window": list(pygame.display.get_surface().get_size()),
+        },
+        "scenarios": {},
+    }
+    for scenario in SCENARIOS:
+        if names and scenario.name not in names:
+            continue
+        results["scenarios"][scenario.name] = run_scenario(
+            scenario, frames, warmup, seed, dirty_rects)
+    return results
+
+def measure_particle_draw(counts=PARTICLE_COUNTS, frames=60, seed=0):
+    # {count: (ms per frame drawing every particle, ms with the draw limit)}
+    # for bursts spread over the screen, to choose PARTICLE_DRAW_LIMIT
+    game.init()
+    rng = random.Random(seed)
+    limit = game.PARTICLE_DRAW_LIMIT
+    timings = {}
+    for count in counts:
+        particles = ParticleSystem(count, seed=seed)
+        while len(particles) < count:
+            particles.emit(rng.uniform(0, SCREEN_WIDTH), rng.uniform(100, 450),
+                           rng.random() < 0.5, 20)
+        timing = []
+        for draw_limit in (count, limit):
+            game.PARTICLE_DRAW_LIMIT = draw_limit
+            game.draw_particles(game.screen, particles)
+            started = time.perf_counter()
+            for _ in range(frames):
+                game.draw_particles(game.screen, particles)
+            timing.append((time.perf_counter() - started) * 1000 / frames)
+        game.PARTICLE_DRAW_LIMIT = limit
+        timings[count] = tuple(timing)
+    return timings
+
+def compared_metrics(summary):
+    # (metric name, milliseconds) pairs that are checked against the baseline.
+    # p99 and max are only reported: a handful of slow frames caused by the
+    # OS scheduler would make them fail at random.
+    frame_ms = summary["frame_ms"]
+    metrics = [(f"frame {key}", frame_ms[key]) for key in ("p50", "p95")]
+    for phase, timing in summary["phases_ms"].items():
+        metrics.append((f"{phase} mean", timing["mean"]))
+    return metrics
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for name, summary in results["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+        reference = dict(compared_metrics(baseline["scenarios"][name]))
+        for metric, value in compared_metrics(summary):
+            if metric not in reference:
+                continue
+            limit = reference[metric]
+            if value > limit * (1 + tolerance) and value - limit > ABSOLUTE_SLACK_MS:
+                regressions.append((name, metric, value, limit))
+    return regressions
+
+def print_report(results):
+    for name, summary in results["scenarios"].items():
+        frame_ms = summary["frame_ms"]
+        print(f"{name}: p50 {frame_ms['p50']:.3f} ms, p95 {frame_ms['p95']:.3f} ms, "
+              f"p99 {frame_ms['p99']:.3f} ms, max {frame_ms['max']:.3f} ms")
+        for phase, timing in summary["phases_ms"].items():
+            print(f"    {phase:<16} mean {timing['mean']:.3f} ms  p95 {timing['p95']:.3f} ms")
+        gc_stats = summary["entities"].get("gc")
+        if gc_stats:
+            print(f"    GC: {sum(gc_stats['collections'])} pauses, "
+                  f"{gc_stats['pause_ms']:.2f} ms total, max {gc_stats['max_pause_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark Prompt Runner rendering headlessly")
+    parser.add_argument("--frames", type=int, default=600, help="measured frames per scenario")
+    parser.add_argument("--warmup", type=int, default=60, help="unmeasured frames first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", action="append",
+                        choices=[scenario.name for scenario in SCENARIOS],
+                        help="only run this scenario (repeatable)")
+    parser.add_argument("--dirty-rects", action="store_true")
+    parser.add_argument("--window", metavar="WxH", type=lambda text: tuple(map(int, text.split("x"))),
+                        help="scale the game to a window of this size")
+    parser.add_argument("--scale", choices=game.SCALE_MODES, default=game.FIT)
+    parser.add_argument("--smooth", action="store_true")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_FILE,
+                        help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="save these results as the new baseline")
+    parser.add_argument("--particles", action="store_true",
+                        help="only time the particle draw at growing particle counts")
+    args = parser.parse_args()
+
+    if args.particles:
+        timings = measure_particle_draw(seed=args.seed)
+        for count, (full_ms, limited_ms) in timings.items():
+            print(f"{count:>6} particles: {full_ms:6.2f} ms drawing all, "
+                  f"{limited_ms:6.2f} ms with the limit of {game.PARTICLE_DRAW_LIMIT}")
+        fitting = [count for count, (full_ms, _) in timings.items()
+                   if full_ms <= PARTICLE_BUDGET_MS]
+        print(f"Most particles drawn in full within {PARTICLE_BUDGET_MS:.0f} ms: "
+              f"{max(fitting) if fitting else 'none measured'}")
+        sys.exit(0)
+
+    results = run_all(args.scenario, args.frames, args.warmup, args.seed, args.dirty_rects,
+                      args.window, args.scale, args.smooth)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nPERFORMANCE REGRESSION against {args.baseline}:")
+            for name, metric, value, limit in regressions:
+                print(f"    {name} {metric}: {value:.3f} ms (baseline {limit:.3f} ms, "
+                      f"+{(value / limit - 1) * 100 if limit else float('inf'):.0f}%)")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
@@ -0,0 +1,74 @@
+import math
+
+# Collision tests for the simulation.
+# Prompts enter on the right and all move left at the same speed, so the
+# prompt list is always sorted by x. Each player only needs the prompts in
+# its own x-range, found by binary search, instead of testing every prompt.
+# Tests are swept over each tick so fast prompts can never tunnel through.
+
+def check_collision(player, prompt):
+    # Same result as pygame.Rect(...).colliderect(...): coordinates are
+    # truncated to integers and touching edges do not count as overlap.
+    px = int(player.x)
+    py = int(player.y)
+    qx = int(prompt.x)
+    qy = int(prompt.y)
+    return (px < qx + prompt.width and qx < px + player.width and
+            py < qy + prompt.height and qy < py + player.height)
+
+def _sweep_interval(a_min, a_size, b_min, b_size, velocity):
+    # Times t (in step fractions) during which the open spans overlap while
+    # span b moves by `velocity`
+    if velocity == 0:
+        if b_min < a_min + a_size and a_min < b_min + b_size:
+            return -math.inf, math.inf
+        return math.inf, -math.inf
+    t1 = (a_min - b_min - b_size) / velocity
+    t2 = (a_min + a_size - b_min) / velocity
+    return (t1, t2) if t1 < t2 else (t2, t1)
+
+def swept_collision(player, prompt):
+    # Continuous test over the last tick: the player moved vertically from
+    # prev_y to y while the prompt moved horizontally from prev_x to x. Only
+    # valid for one tick, over which both paths are taken as straight lines.
+    # Overlap at the end of the step uses the pixel rules of check_collision;
+    # on top of that, a prompt that entered and left the player within the
+    # step (too fast to ever be seen overlapping) still counts as a hit.
+    if check_collision(player, prompt):
+        return True
+
+    # Sweep the truncated boxes, so both ends of the step agree with the
+    # pixel test. Work in the player's frame, where only the prompt moves.
+    prev_x = int(prompt.prev_x)
+    prev_y = int(player.prev_y)
+    enter_x, exit_x = _sweep_interval(int(player.x), player.width, prev_x, prompt.width,
+                                      int(prompt.x) - prev_x)
+    enter_y, exit_y = _sweep_interval(prev_y, player.height, int(prompt.y), prompt.height,
+                                      prev_y - int(player.y))
+    enter = max(enter_x, enter_y)
+    leave = min(exit_x, exit_y)
+    return enter < leave and enter < 1.0 and leave > 0.0
+
+def first_at_or_after(entities, x, lo=0):
+    # Index of the first entity with entity.x >= x in a list sorted by x
+    hi = len(entities)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if entities[mid].x < x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def x_range(prompts, left, right, max_width):
+    # Slice bounds of the prompts whose span can reach into [left, right).
+    # One pixel of slack on each side covers integer truncation.
+    start = first_at_or_after(prompts, left - max_width - 1)
+    end = first_at_or_after(prompts, right + 1, start)
+    return start, end
+
+def find_collisions(player, prompts, max_width, sweep=0):
+    # Indices of prompts that touched `player` during the last tick, in list
+    # order. `sweep` is how far every prompt moved left this tick.
+    start, end = x_range(prompts, player.x - sweep, player.x + player.width, max_width)
+    return [i for i in range(start, end) if swept_collision(player, prompts[i])]
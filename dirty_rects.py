@@ -0,0 +1,56 @@
+import pygame
+
+# Dirty-rectangle presentation.
+# Instead of clearing and flipping the whole window each frame, only the
+# areas covered by last frame's sprites are restored from a cached background
+# and only the old and new sprite areas are pushed to the display.
+# `display` is anything with flip() and update(rects), like pygame.display.
+
+class DirtyRectRenderer:
+    def __init__(self, background, max_rects=48, display=pygame.display):
+        self.background = background
+        self.display = display
+        self.bounds = background.get_rect()
+        self.max_rects = max_rects  # above this, one union rect is cheaper
+        self.previous = []
+        self.current = []
+        self.full_redraw = True
+        self.updated_rects = 0
+
+    def invalidate(self, background=None):
+        # Forces a full-screen redraw on the next frame
+        if background is not None:
+            self.background = background
+            self.bounds = background.get_rect()
+        self.previous = []
+        self.full_redraw = True
+
+    def begin(self, screen):
+        # Erase everything drawn last frame by restoring the background under it
+        if self.full_redraw:
+            screen.blit(self.background, (0, 0))
+        else:
+            background = self.background
+            for rect in self.previous:
+                screen.blit(background, rect, rect)
+        self.current = []
+
+    def add(self, rect):
+        if rect is None:
+            return
+        rect = self.bounds.clip(rect)
+        if rect.width and rect.height:
+            self.current.append(rect)
+
+    def present(self):
+        if self.full_redraw:
+            self.display.flip()
+            self.full_redraw = False
+            self.updated_rects = 1
+        else:
+            rects = self.previous + self.current
+            if len(rects) > self.max_rects:
+                rects = [rects[0].unionall(rects[1:])]
+            self.display.update(rects)
+            self.updated_rects = len(rects)
+        self.previous = self.current
@@ -1,23 +1,38 @@
+import time
+
+# Measured from as early as possible, for the time-to-first-frame report
+STARTED = time.perf_counter()
+
 import pygame
 import random
 import sys
-import os
 import math
+import sqlite3
+
+import numpy as np
 
-# Initialize pygame
-pygame.init()
-pygame.mixer.init()
-
-# Game constants
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-GROUND_HEIGHT = 50
-GRAVITY = 0.6
-JUMP_FORCE = -15
-PROMPT_SPEED = 5
-PROMPT_SPAWN_RATE = 60  # Frames between prompt spawns
-GAME_SPEED_INCREASE = 0.0001  # How much to increase speed per frame
-CLOUD_SPEED = 1
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, GROUND_HEIGHT, FPS,
+    MENU, PLAYING, GAME_OVER,
+    ACTION_JUMP, ACTION_START,
+    EVENT_JUMP, EVENT_GOOD_COLLECT, EVENT_BAD_COLLECT, EVENT_GAME_OVER,
+    PARTICLES_PER_BURST,
+    GameSimulation, Player,
+)
+from particles import KIND_GOOD, KIND_BAD
+from render_cache import PromptSpriteCache, ScrollingLayer, TextCache
+from dirty_rects import DirtyRectRenderer
+from scaling import FIT, SCALE_MODES, ScaledDisplay
+from timestep import FixedTimestep, lerp
+from profiling import PhaseTimer, TelemetryWriter, QualityGovernor, RateCounter
+from assets import AssetLoader, load_font
+from replay import Recording
+from pipeline import SimulationThread
+from inputs import InputPipeline
+from audio import AudioManager
+from multiplayer import DEFAULT_PORT, SEND_INTERVAL, RaceClient, run_distance
+from scores import SCORES_FILE, DEFAULT_PLAYER, Run, ScoreStore
+from pools import GCMonitor
 
 # Colors
 WHITE = (255, 255, 255)
@@ -30,435 +45,1024 @@ YELLOW = (255, 255, 0)
 LIGHT_BLUE = (135, 206, 235)
 CLOUD_WHITE = (240, 240, 240)
 
-# Set up the display
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Prompt Runner")
-clock = pygame.time.Clock()
-
-# Load fonts
-font_large = pygame.font.SysFont('Arial', 48)
-font_medium = pygame.font.SysFont('Arial', 36)
-font_small = pygame.font.SysFont('Arial', 24)
-
-# Game states
-MENU = 0
-PLAYING = 1
-GAME_OVER = 2
-
-# Try to load sounds
-try:
-    jump_sound = pygame.mixer.Sound(os.path.join('sounds', 'jump.wav'))
-    good_collect_sound = pygame.mixer.Sound(os.path.join('sounds', 'good_collect.wav'))
-    bad_collect_sound = pygame.mixer.Sound(os.path.join('sounds', 'bad_collect.wav'))
-    game_over_sound = pygame.mixer.Sound(os.path.join('sounds', 'game_over.wav'))
-except:
-    print("Sound files not found. Game will run without sound.")
-    jump_sound = None
-    good_collect_sound = None
-    bad_collect_sound = None
-    game_over_sound = None
-
-class Player:
-    def __init__(self):
-        self.width = 50
-        self.height = 80
-        self.x = 100
-        self.y = SCREEN_HEIGHT - GROUND_HEIGHT - self.height
-        self.vel_y = 0
-        self.is_jumping = False
-        self.color = BLUE
-        self.animation_frame = 0
-        self.animation_speed = 0.2
-    
-    def update(self):
-        # Apply gravity
-        self.vel_y += GRAVITY
-        self.y += self.vel_y
-        
-        # Check for ground collision
-        if self.y > SCREEN_HEIGHT - GROUND_HEIGHT - self.height:
-            self.y = SCREEN_HEIGHT - GROUND_HEIGHT - self.height
-            self.vel_y = 0
-            self.is_jumping = False
-        
-        # Update animation frame
-        self.animation_frame += self.animation_speed
-        if self.animation_frame >= 4:
-            self.animation_frame = 0
-    
-    def jump(self):
-        if not self.is_jumping:
-            self.vel_y = JUMP_FORCE
-            self.is_jumping = True
-            if jump_sound:
-                jump_sound.play()
-    
-    def draw(self, screen):
-        # Draw player body
-        pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
-        
-        # Draw face
-        pygame.draw.circle(screen, WHITE, (self.x + 25, self.y + 20), 10)  # Left eye
-        pygame.draw.circle(screen, WHITE, (self.x + 40, self.y + 20), 10)  # Right eye
-        pygame.draw.circle(screen, BLACK, (self.x + 25, self.y + 20), 5)   # Left pupil
-        pygame.draw.circle(screen, BLACK, (self.x + 40, self.y + 20), 5)   # Right pupil
-        
-        # Animated smile based on jumping state
-        if self.is_jumping:
-            pygame.draw.arc(screen, BLACK, (self.x + 15, self.y + 30, 30, 20), 0, 3.14, 3)  # Smile
-        else:
-            # Running animation for mouth
-            mouth_offset = math.sin(self.animation_frame) * 5
-            pygame.draw.arc(screen, BLACK, (self.x + 15, self.y + 30 + mouth_offset, 30, 20), 0, 3.14, 3)
-        
-        # Draw legs with running animation when on ground
-        if not self.is_jumping:
-            leg_offset = math.sin(self.animation_frame * 2) * 10
-            # Left leg
-            pygame.draw.line(screen, self.color, 
-                            (self.x + 15, self.y + self.height),
-                            (self.x + 15 - leg_offset, self.y + self.height + 15), 5)
-            # Right leg
-            pygame.draw.line(screen, self.color, 
-                            (self.x + self.width - 15, self.y + self.height),
-                            (self.x + self.width - 15 + leg_offset, self.y + self.height + 15), 5)
-        else:
-            # Jumping pose
-            pygame.draw.line(screen, self.color, 
-                            (self.x + 15, self.y + self.height),
-                            (self.x, self.y + self.height + 10), 5)
-            pygame.draw.line(screen, self.color, 
-                            (self.x + self.width - 15, self.y + self.height),
-                            (self.x + self.width, self.y + self.height + 10), 5)
-
-class Prompt:
-    def __init__(self, x, is_good):
-        self.width = 80
-        self.height = 40
-        self.x = x
-        self.y = random.randint(100, SCREEN_HEIGHT - GROUND_HEIGHT - 100)
-        self.is_good = is_good
-        self.color = GREEN if is_good else RED
-        self.speed = PROMPT_SPEED
-        self.text = random.choice(["Good!", "Nice!", "Great!"] if is_good else ["Bad!", "Wrong!", "Avoid!"])
-        self.rotation = 0
-        self.rotation_speed = random.uniform(-2, 2)
-        self.pulse_size = 0
-        self.pulse_direction = 1
-    
-    def update(self, game_speed):
-        self.x -= self.speed * game_speed
-        self.rotation += self.rotation_speed
-        
-        # Pulsing effect
-        self.pulse_size += 0.1 * self.pulse_direction
-        if self.pulse_size > 1 or self.pulse_size < 0:
-            self.pulse_direction *= -1
-    
-    def draw(self, screen):
-        # Create a surface for the prompt
-        prompt_surface = pygame.Surface((self.width + 10, self.height + 10), pygame.SRCALPHA)
-        
-        # Draw the prompt on the surface
-        pygame.draw.rect(prompt_surface, self.color, 
-                        (5, 5, self.width + self.pulse_size, self.height + self.pulse_size))
-        
-        # Add text
-        text = font_small.render(self.text, True, WHITE)
-        text_rect = text.get_rect(center=(self.width/2 + 5, self.height/2 + 5))
-        prompt_surface.blit(text, text_rect)
-        
-        # Rotate the surface
-        rotated_surface = pygame.transform.rotate(prompt_surface, self.rotation)
-        rotated_rect = rotated_surface.get_rect(center=(self.x + self.width/2, self.y + self.height/2))
-        
-        # Draw the rotated surface
-        screen.blit(rotated_surface, rotated_rect)
-
-class Cloud:
-    def __init__(self):
-        self.x = SCREEN_WIDTH + random.randint(0, 100)
-        self.y = random.randint(50, 200)
-        self.speed = random.uniform(0.5, 1.5)
-        self.width = random.randint(60, 120)
-        self.height = random.randint(30, 60)
-    
-    def update(self):
-        self.x -= self.speed
-        if self.x < -self.width:
-            self.x = SCREEN_WIDTH + random.randint(0, 100)
-            self.y = random.randint(50, 200)
-    
-    def draw(self, screen):
-        # Draw a fluffy cloud
-        pygame.draw.ellipse(screen, CLOUD_WHITE, (self.x, self.y, self.width, self.height))
-        pygame.draw.ellipse(screen, CLOUD_WHITE, (self.x + self.width * 0.2, self.y - self.height * 0.2, self.width * 0.6, self.height * 0.6))
-        pygame.draw.ellipse(screen, CLOUD_WHITE, (self.x + self.width * 0.4, self.y + self.height * 0.1, self.width * 0.6, self.height * 0.6))
-
-class Particle:
-    def __init__(self, x, y, color):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.size = random.randint(3, 8)
-        self.vel_x = random.uniform(-3, 3)
-        self.vel_y = random.uniform(-5, -1)
-        self.gravity = 0.2
-        self.life = 30  # frames
-    
-    def update(self):
-        self.x += self.vel_x
-        self.y += self.vel_y
-        self.vel_y += self.gravity
-        self.life -= 1
-        self.size = max(0, self.size - 0.1)
-    
-    def draw(self, screen):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), int(self.size))
-
-def check_collision(player, prompt):
-    player_rect = pygame.Rect(player.x, player.y, player.width, player.height)
-    prompt_rect = pygame.Rect(prompt.x, prompt.y, prompt.width, prompt.height)
-    return player_rect.colliderect(prompt_rect)
-
-def draw_ground():
+# Display, fonts and caches; created by init() rather than at import.
+# `screen` is what everything draws on and `display` presents it: the window
+# and pygame.display, or a canvas scaled to the window by a ScaledDisplay.
+screen = None
+display = None
+clock = None
+font_large = None
+font_medium = None
+font_small = None
+text_large = None
+text_medium = None
+text_small = None
+prompt_sprites = None
+
+# Sounds and other slow assets load in the background while the menu shows
+assets = AssetLoader()
+
+def init(window_size=None, fullscreen=False, scale_mode=FIT, smooth=False):
+    # Opens the window and loads what the first frame needs. Only display
+    # and fonts are started here; the mixer is opened by the asset loader.
+    # With a window size or fullscreen the game is drawn at SCREEN_WIDTH x
+    # SCREEN_HEIGHT and scaled to the window (`scale_mode` is fit or integer).
+    global screen, display, clock, font_large, font_medium, font_small
+    global text_large, text_medium, text_small, prompt_sprites
+    if screen is not None:
+        return
+
+    pygame.display.init()
+    pygame.font.init()
+
+    # Set up the display
+    if window_size is None and not fullscreen:
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        display = pygame.display
+    else:
+        display = ScaledDisplay((SCREEN_WIDTH, SCREEN_HEIGHT), window_size, fullscreen,
+                                scale_mode, smooth)
+        screen = display.canvas
+    pygame.display.set_caption("Prompt Runner")
+    clock = pygame.time.Clock()
+    clock.tick()  # also starts pygame's millisecond timer (get_ticks)
+
+    # Load fonts
+    font_large = load_font('Arial', 48)
+    font_medium = load_font('Arial', 36)
+    font_small = load_font('Arial', 24)
+
+    # Memoized text rendering for the HUD and menus
+    text_large = TextCache(font_large)
+    text_medium = TextCache(font_medium)
+    text_small = TextCache(font_small)
+
+    # Cache of pre-rendered prompt sprites
+    prompt_sprites = PromptSpriteCache(font_small, WHITE)
+
+    assets.add("audio", AudioManager.load)
+    assets.add("particle_sprites", build_particle_sprites)
+    assets.start()
+
+# Rendering is decoupled from the FPS simulation ticks; this only caps it
+RENDER_FPS_CAP = 120
+
+# Input is read again this often while waiting for the next frame, so presses
+# are timestamped close to when they happened
+INPUT_POLL_INTERVAL = 0.001
+
+# A jump pressed this long before landing still happens on landing, and one
+# pressed this long after leaving the ground still counts
+JUMP_BUFFER_MS = 100
+COYOTE_TIME_MS = 100
+
+# Length of the fade into the game over screen
+GAME_OVER_FADE_MS = 1200
+LEADERBOARD_SIZE = 5  # players listed on the game over screen
+
+# Background layout
+CLOUD_LAYER_TOP = 30
+CLOUD_LAYER_HEIGHT = 240
+GRASS_MAX_HEIGHT = 10
+GROUND_SEED = 7
+
+# Profiling overlay (F3)
+OVERLAY_HISTORY = 240          # frames shown in the frame time graph
+OVERLAY_REFRESH_MS = 250       # how often the numbers are re-averaged
+OVERLAY_AVERAGE_FRAMES = 30
+OVERLAY_GRAPH_HEIGHT = 60
+OVERLAY_GRAPH_MAX_MS = 40.0
+
+# Phases of a frame, in order, as recorded by the main loop
+FRAME_PHASES = (
+    "events", "player_update", "prompt_update", "collision", "particle_update",
+    "background_draw", "menu_draw", "ghost_draw", "player_draw", "prompt_draw", "particle_draw",
+    "hud_draw", "overlay_draw", "present", "wait",
+)
+TELEMETRY_FIELDS = ("frame", "time_ms", "state", "frame_ms", "tick_rate", "input_latency_ms",
+                    "quality",
+                    "prompts", "particles", "clouds") + FRAME_PHASES
+
+# Levels of detail, from full quality down. The quality governor moves one
+# level at a time; each level keeps the savings of the ones before it.
+QUALITY_LEVELS = (
+    {"name": "full", "particles": PARTICLES_PER_BURST,
+     "rotation": True, "static_clouds": False, "flat": False},
+    {"name": "fewer particles", "particles": 5,
+     "rotation": True, "static_clouds": False, "flat": False},
+    {"name": "no rotation", "particles": 5,
+     "rotation": False, "static_clouds": False, "flat": False},
+    {"name": "static clouds", "particles": 5,
+     "rotation": False, "static_clouds": True, "flat": False},
+    {"name": "flat", "particles": 5,
+     "rotation": False, "static_clouds": True, "flat": True},
+)
+FULL_QUALITY = QUALITY_LEVELS[0]
+FRAME_BUDGET_MS = 1000 / FPS  # drawing a frame should take less than one tick
+
+# Sounds triggered by simulation events
+EVENT_SOUNDS = {
+    EVENT_JUMP: "jump",
+    EVENT_GOOD_COLLECT: "good_collect",
+    EVENT_BAD_COLLECT: "bad_collect",
+    EVENT_GAME_OVER: "game_over",
+}
+
+# Player poses are pre-rendered into one sheet: ANIMATION_FRAMES running
+# frames over one animation cycle, then the jumping pose and the flat pose
+ANIMATION_CYCLE = 4  # Player.animation_frame wraps around at this value
+ANIMATION_FRAMES = 20  # one per Player.animation_speed step
+PLAYER_SPRITE_MARGIN = 5  # room around the body for the legs
+PLAYER_SPRITE_LEGS = 20
+SPRITE_COLORKEY = (255, 0, 255)
+player_atlases = {}
+
+# Other players of a ghost race are drawn see-through in their own colour
+GHOST_COLOR = (60, 60, 140)
+GHOST_ALPHA = 110
+ghost_atlas = None
+
+def draw_player_pose(screen, player, color, y):
+    # Draw player body
+    rects = [pygame.draw.rect(screen, color, (player.x, y, player.width, player.height))]
+
+    # Draw face
+    pygame.draw.circle(screen, WHITE, (player.x + 25, y + 20), 10)  # Left eye
+    pygame.draw.circle(screen, WHITE, (player.x + 40, y + 20), 10)  # Right eye
+    pygame.draw.circle(screen, BLACK, (player.x + 25, y + 20), 5)   # Left pupil
+    pygame.draw.circle(screen, BLACK, (player.x + 40, y + 20), 5)   # Right pupil
+
+    # Animated smile based on jumping state
+    if player.is_jumping:
+        pygame.draw.arc(screen, BLACK, (player.x + 15, y + 30, 30, 20), 0, 3.14, 3)  # Smile
+    else:
+        # Running animation for mouth
+        mouth_offset = math.sin(player.animation_frame) * 5
+        pygame.draw.arc(screen, BLACK, (player.x + 15, y + 30 + mouth_offset, 30, 20), 0, 3.14, 3)
+
+    # Draw legs with running animation when on ground
+    if not player.is_jumping:
+        leg_offset = math.sin(player.animation_frame * 2) * 10
+        # Left leg
+        rects.append(pygame.draw.line(screen, color,
+                        (player.x + 15, y + player.height),
+                        (player.x + 15 - leg_offset, y + player.height + 15), 5))
+        # Right leg
+        rects.append(pygame.draw.line(screen, color,
+                        (player.x + player.width - 15, y + player.height),
+                        (player.x + player.width - 15 + leg_offset, y + player.height + 15), 5))
+    else:
+        # Jumping pose
+        rects.append(pygame.draw.line(screen, color,
+                        (player.x + 15, y + player.height),
+                        (player.x, y + player.height + 10), 5))
+        rects.append(pygame.draw.line(screen, color,
+                        (player.x + player.width - 15, y + player.height),
+                        (player.x + player.width, y + player.height + 10), 5))
+
+    return rects[0].unionall(rects[1:])
+
+def draw_flat_player(screen, player, color, y):
+    # Low-detail player, as drawn by main.py: no limbs or mouth animation
+    rect = pygame.draw.rect(screen, color, (player.x, y, player.width, player.height))
+    pygame.draw.circle(screen, WHITE, (player.x + 25, y + 20), 10)  # Left eye
+    pygame.draw.circle(screen, WHITE, (player.x + 40, y + 20), 10)  # Right eye
+    pygame.draw.circle(screen, BLACK, (player.x + 25, y + 20), 5)   # Left pupil
+    pygame.draw.circle(screen, BLACK, (player.x + 40, y + 20), 5)   # Right pupil
+    pygame.draw.arc(screen, BLACK, (player.x + 15, y + 30, 30, 20), 0, 3.14, 3)  # Smile
+    return rect
+
+class PlayerAtlas:
+    def __init__(self, color):
+        template = Player()
+        self.frame_width = template.width + 2 * PLAYER_SPRITE_MARGIN
+        self.frame_height = template.height + PLAYER_SPRITE_LEGS
+        self.jumping_frame = ANIMATION_FRAMES
+        self.flat_frame = ANIMATION_FRAMES + 1
+
+        sheet = pygame.Surface((self.frame_width * (ANIMATION_FRAMES + 2), self.frame_height))
+        sheet.fill(SPRITE_COLORKEY)
+        for frame in range(ANIMATION_FRAMES + 2):
+            pose = Player()
+            pose.x = frame * self.frame_width + PLAYER_SPRITE_MARGIN
+            if frame == self.flat_frame:
+                draw_flat_player(sheet, pose, color, 0)
+            else:
+                pose.is_jumping = frame == self.jumping_frame
+                pose.animation_frame = frame * ANIMATION_CYCLE / ANIMATION_FRAMES
+                draw_player_pose(sheet, pose, color, 0)
+
+        if pygame.display.get_surface() is not None:
+            sheet = sheet.convert()
+        sheet.set_colorkey(SPRITE_COLORKEY, pygame.RLEACCEL)
+        self.sheet = sheet
+        self.areas = [pygame.Rect(frame * self.frame_width, 0, self.frame_width, self.frame_height)
+                      for frame in range(ANIMATION_FRAMES + 2)]
+
+    def frame(self, player, flat=False):
+        if flat:
+            return self.flat_frame
+        if player.is_jumping:
+            return self.jumping_frame
+        return round(player.animation_frame * ANIMATION_FRAMES / ANIMATION_CYCLE) % ANIMATION_FRAMES
+
+    def draw(self, screen, player, y, flat=False):
+        return screen.blit(self.sheet, (player.x - PLAYER_SPRITE_MARGIN, y),
+                           self.areas[self.frame(player, flat)])
+
+def draw_player(screen, player, color=BLUE, y=None, flat=False):
+    # One blit from the pre-rendered poses for this colour
+    if y is None:
+        y = player.y
+    atlas = player_atlases.get(color)
+    if atlas is None:
+        atlas = player_atlases[color] = PlayerAtlas(color)
+    return atlas.draw(screen, player, y, flat)
+
+def draw_ghosts(screen, ghosts, distance):
+    # Ghosts are placed by how far ahead or behind they are of the local
+    # player, who has scrolled `distance` into the run; returns the rects drawn
+    global ghost_atlas
+    if ghost_atlas is None:
+        ghost_atlas = PlayerAtlas(GHOST_COLOR)
+        ghost_atlas.sheet.set_alpha(GHOST_ALPHA)
+    rects = []
+    for ghost in ghosts:
+        if ghost.state != PLAYING:
+            continue
+        x = ghost.x + run_distance(ghost.run_tick) - distance
+        if not -ghost_atlas.frame_width < x < SCREEN_WIDTH:
+            continue
+        rect = ghost_atlas.draw(screen, ghost._replace(x=x), ghost.y)
+        rects.append(rect)
+        rects.append(text_small.blit(screen, ghost.name, GHOST_COLOR,
+                                     center=(rect.centerx, rect.top - 12)))
+    return rects
+
+def draw_prompt(screen, prompt, x=None, rotate=True, flat=False):
+    if x is None:
+        x = prompt.x
+    color = GREEN if prompt.is_good else RED
+
+    if flat:
+        # Plain box and label, as drawn by main.py
+        rect = pygame.draw.rect(screen, color, (x, prompt.y, prompt.width, prompt.height))
+        label = prompt_sprites.label(prompt.text)
+        screen.blit(label, label.get_rect(center=(x + prompt.width/2, prompt.y + prompt.height/2)))
+        return rect
+
+    # Rotated, pulsed sprites come from the cache instead of being rebuilt each frame
+    if rotate:
+        sprite = prompt_sprites.get(prompt.text, color, prompt.width, prompt.height,
+                                    prompt.pulse_size, prompt.rotation)
+    else:
+        sprite = prompt_sprites.get(prompt.text, color, prompt.width, prompt.height, 0, 0)
+    sprite_rect = sprite.get_rect(center=(x + prompt.width/2, prompt.y + prompt.height/2))
+    return screen.blit(sprite, sprite_rect)
+
+def draw_cloud(screen, cloud, x, y):
+    # Draw a fluffy cloud
+    rect = pygame.draw.ellipse(screen, CLOUD_WHITE, (x, y, cloud.width, cloud.height))
+    return rect.unionall([
+        pygame.draw.ellipse(screen, CLOUD_WHITE, (x + cloud.width * 0.2, y - cloud.height * 0.2, cloud.width * 0.6, cloud.height * 0.6)),
+        pygame.draw.ellipse(screen, CLOUD_WHITE, (x + cloud.width * 0.4, y + cloud.height * 0.1, cloud.width * 0.6, cloud.height * 0.6)),
+    ])
+
+# Pre-rendered particle circles, indexed by kind * (PARTICLE_MAX_RADIUS + 1) + radius
+PARTICLE_MAX_RADIUS = 8
+# Most particles drawn per frame; beyond this an even sample is drawn. Each
+# particle is one blit of about 0.5 us, so 15000 keeps the particle draw
+# within 8 ms, half a frame (measured with `python benchmark.py --particles`:
+# 7.5 ms for 15000, 17 ms for 30000 drawn in full).
+PARTICLE_DRAW_LIMIT = 15000
+particle_sprites = None
+
+def build_particle_sprites():
+    sprites = np.empty(2 * (PARTICLE_MAX_RADIUS + 1), dtype=object)
+    for kind, color in ((KIND_BAD, RED), (KIND_GOOD, GREEN)):
+        for radius in range(1, PARTICLE_MAX_RADIUS + 1):
+            sprite = pygame.Surface((radius * 2, radius * 2))
+            sprite.fill(BLACK)
+            sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+            pygame.draw.circle(sprite, color, (radius, radius), radius)
+            sprites[kind * (PARTICLE_MAX_RADIUS + 1) + radius] = sprite
+    return sprites
+
+def draw_particles(screen, particles):
+    global particle_sprites
+    if not len(particles):
+        return None
+    if particle_sprites is None:
+        particle_sprites = assets.get("particle_sprites")
+        if particle_sprites is None:
+            particle_sprites = build_particle_sprites()
+
+    xs, ys, radii, kinds = particles.live()
+    visible = radii > 0
+    xs, ys, radii, kinds = xs[visible], ys[visible], radii[visible], kinds[visible]
+    if len(xs) > PARTICLE_DRAW_LIMIT:
+        # Draw an even sample; a storm this dense looks the same with fewer
+        step = -(-len(xs) // PARTICLE_DRAW_LIMIT)
+        xs, ys, radii, kinds = xs[::step], ys[::step], radii[::step], kinds[::step]
+
+    # Look up every sprite at once and hand the whole batch to a single blits
+    # call. The pairs are zipped on the fly, so no per-particle list is built
+    # and each tuple is freed right after its blit (no garbage collections).
+    sprites = particle_sprites[kinds.astype(np.intp) * (PARTICLE_MAX_RADIUS + 1) + radii]
+    screen.blits(zip(sprites.tolist(), zip((xs - radii).tolist(), (ys - radii).tolist())),
+                 False)
+
+    # Bounding box of the whole batch, for dirty-rect tracking
+    if not len(xs):
+        return None
+    left = int(xs.min()) - PARTICLE_MAX_RADIUS
+    top = int(ys.min()) - PARTICLE_MAX_RADIUS
+    return pygame.Rect(left, top,
+                       int(xs.max()) + PARTICLE_MAX_RADIUS - left,
+                       int(ys.max()) + PARTICLE_MAX_RADIUS - top)
+
+def draw_ground_tile(surface, shift):
+    # Ground strip contents; `top` is the ground line inside the layer surface
+    top = GRASS_MAX_HEIGHT
+    rng = random.Random(GROUND_SEED)  # same blades on every copy of the tile
+
     # Draw ground
-    pygame.draw.rect(screen, GRAY, (0, SCREEN_HEIGHT - GROUND_HEIGHT, SCREEN_WIDTH, GROUND_HEIGHT))
-    
+    pygame.draw.rect(surface, GRAY, (shift, top, SCREEN_WIDTH, GROUND_HEIGHT))
+
     # Draw grass on top of ground
-    pygame.draw.rect(screen, GREEN, (0, SCREEN_HEIGHT - GROUND_HEIGHT, SCREEN_WIDTH, 5))
-    
+    pygame.draw.rect(surface, GREEN, (shift, top, SCREEN_WIDTH, 5))
+
     # Draw some ground details
-    for i in range(0, SCREEN_WIDTH, 50):
+    for i in range(shift, shift + SCREEN_WIDTH, 50):
         # Dirt lines
-        pygame.draw.line(screen, (80, 80, 80), (i, SCREEN_HEIGHT - GROUND_HEIGHT + 15), 
-                         (i + 25, SCREEN_HEIGHT - GROUND_HEIGHT + 15), 2)
-        
-        # Random grass blades
-        if random.random() > 0.7:
-            grass_height = random.randint(5, 10)
-            pygame.draw.line(screen, (0, 150, 0), 
-                            (i + random.randint(0, 50), SCREEN_HEIGHT - GROUND_HEIGHT),
-                            (i + random.randint(0, 50), SCREEN_HEIGHT - GROUND_HEIGHT - grass_height), 2)
-
-def show_menu():
-    screen.fill(LIGHT_BLUE)
-    
-    # Draw clouds
-    for cloud in clouds:
-        cloud.draw(screen)
-    
-    # Draw ground
-    draw_ground()
-    
+        pygame.draw.line(surface, (80, 80, 80), (i, top + 15), (i + 25, top + 15), 2)
+
+        # Grass blades
+        if rng.random() > 0.7:
+            grass_height = rng.randint(5, GRASS_MAX_HEIGHT)
+            pygame.draw.line(surface, (0, 150, 0),
+                            (i + rng.randint(0, 50), top),
+                            (i + rng.randint(0, 50), top - grass_height), 2)
+
+class Background:
+    # Parallax cloud strips and the ground strip, each baked once and
+    # scrolled with a single blit per layer
+    def __init__(self, clouds):
+        self.cloud_layers = []
+        for speed in sorted({cloud.speed for cloud in clouds}):
+            layer_clouds = [cloud for cloud in clouds if cloud.speed == speed]
+
+            def draw_clouds(surface, shift, layer_clouds=layer_clouds):
+                for cloud in layer_clouds:
+                    draw_cloud(surface, cloud, cloud.x + shift, cloud.y - CLOUD_LAYER_TOP)
+
+            layer = ScrollingLayer(SCREEN_WIDTH, CLOUD_LAYER_HEIGHT, CLOUD_LAYER_TOP,
+                                   draw_clouds, colorkey=LIGHT_BLUE)
+            self.cloud_layers.append((speed, layer))
+
+        self.ground = ScrollingLayer(SCREEN_WIDTH, GROUND_HEIGHT + GRASS_MAX_HEIGHT,
+                                     SCREEN_HEIGHT - GROUND_HEIGHT - GRASS_MAX_HEIGHT,
+                                     draw_ground_tile, fill=LIGHT_BLUE)
+        self.static_sky = None
+
+    def draw(self, screen, cloud_scroll, ground_scroll):
+        for speed, layer in self.cloud_layers:
+            layer.draw(screen, cloud_scroll * speed)
+        self.ground.draw(screen, ground_scroll)
+
+    def freeze(self, cloud_scroll, ground_scroll=0):
+        # Sky and ground stopped where they are, as one opaque surface;
+        # built once and reused until thaw()
+        if self.static_sky is None:
+            sky = build_sky()
+            for speed, layer in self.cloud_layers:
+                layer.draw(sky, cloud_scroll * speed)
+            self.ground.draw(sky, ground_scroll)
+            self.static_sky = sky
+        return self.static_sky
+
+    def thaw(self):
+        self.static_sky = None
+
+def build_menu_overlay():
+    # Title, menu box and instructions never change, so render them once
+    overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+
     # Draw title with shadow
     title_shadow = font_large.render("PROMPT RUNNER", True, BLACK)
     title = font_large.render("PROMPT RUNNER", True, YELLOW)
-    screen.blit(title_shadow, (SCREEN_WIDTH/2 - title.get_width()/2 + 3, 153))
-    screen.blit(title, (SCREEN_WIDTH/2 - title.get_width()/2, 150))
-    
+    overlay.blit(title_shadow, (SCREEN_WIDTH/2 - title.get_width()/2 + 3, 153))
+    overlay.blit(title, (SCREEN_WIDTH/2 - title.get_width()/2, 150))
+
     # Draw menu box
     menu_box = pygame.Rect(SCREEN_WIDTH/2 - 200, 220, 400, 200)
-    pygame.draw.rect(screen, (50, 50, 50, 200), menu_box)
-    pygame.draw.rect(screen, WHITE, menu_box, 3)
-    
+    pygame.draw.rect(overlay, (50, 50, 50), menu_box)
+    pygame.draw.rect(overlay, WHITE, menu_box, 3)
+
     instructions = [
         "Collect good prompts (green) and avoid bad prompts (red)",
         "Press SPACE to jump",
         "Press ENTER to start",
         "Press ESC to quit"
     ]
-    
+
     for i, line in enumerate(instructions):
         text = font_small.render(line, True, WHITE)
         text_rect = text.get_rect(center=(SCREEN_WIDTH/2, 250 + i * 40))
-        screen.blit(text, text_rect)
-    
+        overlay.blit(text, text_rect)
+
+    return overlay.convert_alpha()
+
+menu_overlay = None
+menu_player = None
+
+def phase_lap(timer):
+    # `timer.lap`, or a no-op when frames are not being profiled
+    if timer is None:
+        return lambda phase: None
+    timer.begin()
+    return timer.lap
+
+def show_menu(sim, background, alpha=1.0, timer=None, overlay=None):
+    global menu_overlay, menu_player
+    if menu_overlay is None:
+        menu_overlay = build_menu_overlay()
+        menu_player = Player()
+        menu_player.x = SCREEN_WIDTH/2 - menu_player.width/2
+        menu_player.y = SCREEN_HEIGHT - GROUND_HEIGHT - menu_player.height - 50
+    lap = phase_lap(timer)
+
+    screen.fill(LIGHT_BLUE)
+    background.draw(screen, lerp(sim.prev_cloud_scroll, sim.cloud_scroll, alpha),
+                    sim.ground_scroll)
+    lap("background_draw")
+    screen.blit(menu_overlay, (0, 0))
+
     # Draw animated character
-    player = Player()
-    player.x = SCREEN_WIDTH/2 - player.width/2
-    player.y = SCREEN_HEIGHT - GROUND_HEIGHT - player.height - 50
-    player.animation_frame = pygame.time.get_ticks() / 200  # Animate based on time
-    player.draw(screen)
-    
-    pygame.display.flip()
-
-def show_game_over(score):
-    # Fade to black
-    fade_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-    fade_surface.fill(BLACK)
-    for alpha in range(0, 200, 5):
-        fade_surface.set_alpha(alpha)
-        screen.blit(fade_surface, (0, 0))
-        pygame.display.flip()
-        pygame.time.delay(30)
-    
-    if game_over_sound:
-        game_over_sound.play()
-    
-    # Game over screen
-    game_over_text = font_large.render("GAME OVER", True, RED)
-    game_over_rect = game_over_text.get_rect(center=(SCREEN_WIDTH/2, 150))
-    screen.blit(game_over_text, game_over_rect)
-    
-    score_text = font_medium.render(f"Final Score: {score}", True, WHITE)
-    score_rect = score_text.get_rect(center=(SCREEN_WIDTH/2, 250))
-    screen.blit(score_text, score_rect)
-    
-    instructions = [
-        "Press ENTER to play again",
-        "Press ESC to quit"
-    ]
-    
-    for i, line in enumerate(instructions):
-        text = font_small.render(line, True, WHITE)
-        text_rect = text.get_rect(center=(SCREEN_WIDTH/2, 350 + i * 40))
-        screen.blit(text, text_rect)
-    
-    pygame.display.flip()
-
-def main():
-    global clouds
-    
-    game_state = MENU
-    player = Player()
-    prompts = []
-    particles = []
-    clouds = [Cloud() for _ in range(5)]
-    score = 0
-    spawn_counter = 0
-    game_speed = 1.0
-    
+    # Animate based on time, cycling through the poses like a running player
+    menu_player.animation_frame = pygame.time.get_ticks() / 200 % ANIMATION_CYCLE
+    draw_player(screen, menu_player)
+    lap("menu_draw")
+
+    if overlay is not None and overlay.visible:
+        overlay.draw(screen, sim)
+        lap("overlay_draw")
+
+    display.flip()
+    lap("present")
+
+def build_sky():
+    # Empty sky, the base of Background.freeze()
+    sky = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+    sky.fill(LIGHT_BLUE)
+    return sky
+
+def show_playing(sim, result, background, dirty=None, alpha=1.0, timer=None, overlay=None,
+                 quality=FULL_QUALITY, ghosts=()):
+    # `alpha` places the frame between the previous and the current tick;
+    # `ghosts` are the other players of a ghost race
+    lap = phase_lap(timer)
+    static_clouds = quality["static_clouds"]
+    if dirty is not None:
+        # Only restore the areas drawn over last frame. Clouds and ground are
+        # frozen into the renderer's background, since scrolling them would
+        # make most of the screen dirty every frame.
+        dirty.begin(screen)
+        add = dirty.add
+    else:
+        if static_clouds:
+            screen.blit(background.freeze(sim.cloud_scroll), (0, 0))
+        else:
+            screen.fill(LIGHT_BLUE)
+        add = lambda rect: None
+
+        # Draw clouds and ground
+        ground_scroll = lerp(sim.prev_ground_scroll, sim.ground_scroll, alpha)
+        if static_clouds:
+            background.ground.draw(screen, ground_scroll)
+        else:
+            background.draw(screen, lerp(sim.prev_cloud_scroll, sim.cloud_scroll, alpha),
+                            ground_scroll)
+    lap("background_draw")
+
+    # Draw ghosts behind the player
+    if ghosts:
+        for rect in draw_ghosts(screen, ghosts, run_distance(sim.play_frame - 1 + alpha)):
+            add(rect)
+        lap("ghost_draw")
+
+    # Draw player
+    player = sim.player
+    add(draw_player(screen, player, y=lerp(player.prev_y, player.y, alpha), flat=quality["flat"]))
+    lap("player_draw")
+
+    # Draw prompts
+    rotate = quality["rotation"]
+    flat = quality["flat"]
+    for prompt in sim.prompts:
+        add(draw_prompt(screen, prompt, x=lerp(prompt.prev_x, prompt.x, alpha),
+                        rotate=rotate, flat=flat))
+    lap("prompt_draw")
+
+    # Draw particles
+    add(draw_particles(screen, sim.particles))
+    lap("particle_draw")
+
+    # Draw score
+    add(text_medium.blit_value(screen, "Score: ", str(result.score), BLACK, (20, 20)))
+
+    # Draw speed
+    add(text_small.blit_value(screen, "Speed: ", f"{result.game_speed:.2f}x", BLACK, (20, 70)))
+    lap("hud_draw")
+
+    if overlay is not None and overlay.visible:
+        add(overlay.draw(screen, sim))
+        lap("overlay_draw")
+
+    if dirty is not None:
+        dirty.present()
+    else:
+        display.flip()
+    lap("present")
+
+class GameOverScreen:
+    # Timed transition: the last gameplay frame fades to black a little each
+    # frame, then the results screen is composed once and reused
+    def __init__(self, scores=None, player=DEFAULT_PLAYER):
+        # With a ScoreStore the results screen also shows the leaderboard
+        self.scores = scores
+        self.player = player
+        self.fade_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        self.fade_surface.fill(BLACK)
+        self.snapshot = None
+        self.final = None
+        self.presented = False
+        self.started = 0
+        self.score = 0
+
+    def start(self, score):
+        self.snapshot = screen.copy()
+        self.final = None
+        self.presented = False
+        self.started = pygame.time.get_ticks()
+        self.score = score
+
+    def compose(self):
+        final = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
+        final.fill(BLACK)
+
+        instructions = [
+            "Press ENTER to play again",
+            "Press ESC to quit"
+        ]
+
+        if self.scores is None:
+            # Game over screen
+            text_large.blit(final, "GAME OVER", RED, center=(SCREEN_WIDTH/2, 150))
+            text_medium.blit(final, f"Final Score: {self.score}", WHITE, center=(SCREEN_WIDTH/2, 250))
+            instructions_top = 350
+        else:
+            text_large.blit(final, "GAME OVER", RED, center=(SCREEN_WIDTH/2, 90))
+            text_medium.blit(final, f"Final Score: {self.score}", WHITE, center=(SCREEN_WIDTH/2, 160))
+            self.draw_leaderboard(final)
+            instructions_top = 490
+
+        for i, line in enumerate(instructions):
+            text_small.blit(final, line, WHITE, center=(SCREEN_WIDTH/2, instructions_top + i * 40))
+
+        return final
+
+    def draw_leaderboard(self, surface):
+        # Indexed queries, fast enough to run inside one frame
+        stats = self.scores.player_stats(self.player)
+        if stats is not None:
+            best, runs = stats
+            text_small.blit(surface, f"{self.player}'s best: {best} "
+                            f"({runs} run{'' if runs == 1 else 's'})", WHITE,
+                            center=(SCREEN_WIDTH/2, 205))
+        text_small.blit(surface, "Top Players", YELLOW, center=(SCREEN_WIDTH/2, 260))
+        for i, (player, best, runs) in enumerate(self.scores.top_players(LEADERBOARD_SIZE)):
+            color = YELLOW if player == self.player else WHITE
+            text_small.blit(surface, f"{i + 1}. {player}: {best}", color,
+                            center=(SCREEN_WIDTH/2, 300 + i * 32))
+
+    def draw(self):
+        if self.final is None:
+            progress = (pygame.time.get_ticks() - self.started) / GAME_OVER_FADE_MS
+            if progress < 1:
+                # Fade to black
+                screen.blit(self.snapshot, (0, 0))
+                self.fade_surface.set_alpha(int(255 * progress))
+                screen.blit(self.fade_surface, (0, 0))
+                display.flip()
+                return
+            self.final = self.compose()
+            self.snapshot = None
+
+        # The finished screen never changes, so present it only once, and
+        # again when a resized or uncovered window needs redrawing
+        if not self.presented or getattr(display, "stale", False):
+            screen.blit(self.final, (0, 0))
+            display.flip()
+            self.presented = True
+
+class ProfilerOverlay:
+    # Live frame time graph, FPS, entity counts and per-phase timings. The
+    # numbers are averaged and rendered a few times a second; only the graph
+    # is redrawn every frame.
+    def __init__(self, timer, visible=False):
+        self.timer = timer
+        self.visible = visible
+        self.font = load_font('Arial', 16)
+        self.panel = None
+        self.refreshed = 0
+        self.quality_level = 0  # set by the main loop
+        self.tick_rate = None  # RateCounter of simulation ticks, set by the main loop
+        self.timestep = None  # FixedTimestep stepping the simulation, set by the main loop
+        self.input_latency = None  # LatencyHistogram, set by the main loop
+        self.gc_monitor = None  # pools.GCMonitor, set by the main loop
+        self.dirty = None  # DirtyRectRenderer with --dirty-rects, set by the main loop
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.panel = None
+
+    def render_panel(self, sim):
+        frames = list(self.timer.frames)[-OVERLAY_AVERAGE_FRAMES:]
+        total_ns = sum(frame_ns for frame_ns, _ in frames)
+        count = max(len(frames), 1)
+        lines = [
+            f"FPS: {len(frames) * 1e9 / total_ns if total_ns else 0:.0f}"
+            + (f"  Ticks: {self.tick_rate.rate:.0f}/s" if self.tick_rate is not None else ""),
+            f"Frame: {total_ns / count / 1e6:.2f} ms"
+            + (f"  Dropped ticks: {self.timestep.dropped_ticks}" if self.timestep is not None else ""),
+            f"Prompts: {len(sim.prompts)}  Particles: {len(sim.particles)}  Clouds: {len(sim.clouds)}",
+            f"Quality: {self.quality_level} ({QUALITY_LEVELS[self.quality_level]['name']})",
+        ]
+        if self.dirty is not None:
+            lines.append(f"Updated rects: {self.dirty.updated_rects}")
+        if not assets.loaded:
+            lines.append("Assets: loading")
+        elif assets.failed:
+            lines.append(f"Assets failed: {', '.join(assets.failed)}")
+        if self.input_latency is not None and self.input_latency.count:
+            latency = self.input_latency
+            lines.append(f"Input latency: p50 {latency.percentile(50):.0f} ms  "
+                         f"p95 {latency.percentile(95):.0f} ms")
+        audio = assets.get("audio")
+        if audio is not None:
+            played, stolen, dropped = audio.stats()
+            lines.append(f"Sounds: {played} played, {stolen} cut off, {dropped} dropped")
+        if self.gc_monitor is not None:
+            gc_stats = self.gc_monitor.stats()
+            lines.append(f"GC: {sum(gc_stats['collections'])} pauses, "
+                         f"{gc_stats['pause_ms']:.1f} ms total, max {gc_stats['max_pause_ms']:.2f} ms")
+        for phase in FRAME_PHASES:
+            phase_ns = sum(phases.get(phase, 0) for _, phases in frames)
+            if phase_ns:
+                lines.append(f"{phase}: {phase_ns / count / 1e6:.3f} ms")
+
+        panel = pygame.Surface((OVERLAY_HISTORY + 20, len(lines) * 18 + OVERLAY_GRAPH_HEIGHT + 20),
+                               pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for i, line in enumerate(lines):
+            panel.blit(self.font.render(line, True, WHITE), (10, 6 + i * 18))
+        return panel.convert_alpha()
+
+    def draw(self, screen, sim):
+        now = pygame.time.get_ticks()
+        if self.panel is None or now - self.refreshed >= OVERLAY_REFRESH_MS:
+            self.panel = self.render_panel(sim)
+            self.refreshed = now
+        rect = screen.blit(self.panel, (SCREEN_WIDTH - self.panel.get_width() - 10, 10))
+
+        # Frame time graph, with a line at the simulation tick budget
+        left = rect.left + 10
+        bottom = rect.bottom - 10
+        scale = OVERLAY_GRAPH_HEIGHT / OVERLAY_GRAPH_MAX_MS
+        budget_y = bottom - 1000 / FPS * scale
+        pygame.draw.line(screen, YELLOW, (left, budget_y), (left + OVERLAY_HISTORY, budget_y))
+        points = [(left + i, bottom - min(frame_ns / 1e6, OVERLAY_GRAPH_MAX_MS) * scale)
+                  for i, (frame_ns, _) in enumerate(self.timer.frames)]
+        if len(points) > 1:
+            pygame.draw.lines(screen, GREEN, False, points)
+        return rect
+
+def main(seed=None, dirty_rects=False, max_fps=RENDER_FPS_CAP, max_catch_up=5,
+         profile=False, telemetry=None, record=None, quality=None,
+         frame_budget=FRAME_BUDGET_MS, window_size=None, fullscreen=False,
+         scale_mode=FIT, smooth=False, threaded=False, player=DEFAULT_PLAYER,
+         scores=SCORES_FILE, jump_buffer_ms=JUMP_BUFFER_MS, coyote_time_ms=COYOTE_TIME_MS,
+         server=None):
+    # `quality` fixes the level of detail; None adapts it to `frame_budget`.
+    # `threaded` runs the simulation on its own thread and draws snapshots of it.
+    # Finished runs are saved under `player` in the `scores` database (None: not saved).
+    # With a `server` (host, port) the game joins its ghost race, on its seed.
+    init(window_size, fullscreen, scale_mode, smooth)
+    scaled = isinstance(display, ScaledDisplay)
+    race = None
+    if server is not None:
+        race = RaceClient(server, player)
+        race_seed = race.join()
+        if race_seed is None:
+            print(f"No ghost race server answered at {server[0]}:{server[1]}; playing alone")
+            race.close()
+            race = None
+        else:
+            seed = race_seed
+    sim = GameSimulation(seed=seed, jump_buffer=round(jump_buffer_ms * FPS / 1000),
+                         coyote_time=round(coyote_time_ms * FPS / 1000),
+                         reseed_runs=race is not None)
+    background = Background(sim.clouds)
+    dirty = (DirtyRectRenderer(background.freeze(sim.cloud_scroll, sim.ground_scroll),
+                               display=display) if dirty_rects else None)
+    timestep = FixedTimestep(FPS, max_catch_up)
+    store = None
+    if scores:
+        try:
+            store = ScoreStore(scores)
+        except (sqlite3.Error, OSError) as error:
+            print(f"Could not open the scores database: {error}")
+    game_over = GameOverScreen(store, player)
+    result = sim.result()
+    shown_state = result.state
+    inputs = InputPipeline()
+
+    # Phase timings are always recorded (it is cheap); F3 shows them. The
+    # simulation phases are only part of a frame when it runs on this thread.
+    timer = PhaseTimer(history=OVERLAY_HISTORY)
+    if not threaded:
+        sim.timer = timer
+    overlay = ProfilerOverlay(timer, visible=profile)
+    writer = TelemetryWriter(telemetry, TELEMETRY_FIELDS) if telemetry else None
+    rendered_frames = 0
+    recording = (Recording(sim.seed, sim.jump_buffer, sim.coyote_time, sim.reseed_runs)
+                 if record else None)
+    governor = QualityGovernor(frame_budget, len(QUALITY_LEVELS)) if quality is None else None
+    level = quality or 0
+    frame_rate = RateCounter()
+    collected = 0
+
+    def on_tick(frame, inputs, result):
+        nonlocal collected
+        if recording is not None:
+            recording.record_step(frame, inputs, result)
+        if store is not None:
+            for event in result.events:
+                if event == EVENT_GOOD_COLLECT:
+                    collected += 1
+                elif event == EVENT_GAME_OVER:
+                    # The speed only grows, so the final speed is the top speed
+                    store.record(Run(player, result.score, sim.play_frame / FPS,
+                                     result.game_speed, collected, sim.seed, time.time()))
+                    collected = 0
+        if race is not None and (frame % SEND_INTERVAL == 0 or EVENT_GAME_OVER in result.events):
+            race.send_state(result.state, sim.play_frame, sim.player.y, sim.player.vel_y,
+                            result.score)
+        audio = assets.get("audio")
+        if audio is not None:
+            for event in result.events:
+                sound = EVENT_SOUNDS.get(event)
+                if sound:
+                    audio.play(sound)
+
+    if threaded:
+        sim_thread = SimulationThread(sim, inputs, on_tick, FPS, max_catch_up)
+        overlay.tick_rate = sim_thread.tick_rate
+        overlay.timestep = sim_thread.timestep
+        sim_thread.start()
+    else:
+        sim_thread = None
+        overlay.tick_rate = tick_rate = RateCounter()
+        overlay.timestep = timestep
+    overlay.input_latency = inputs.latency
+    overlay.dirty = dirty
+    sim.gc_monitor = overlay.gc_monitor = GCMonitor().install()
+
+    def set_quality(level):
+        settings = QUALITY_LEVELS[level]
+        sim.particles_per_burst = settings["particles"]
+        overlay.quality_level = level
+        if dirty is not None:
+            # The dirty-rect renderer always draws on a frozen backdrop
+            dirty.invalidate(background.freeze(sim.cloud_scroll, sim.ground_scroll))
+        elif settings["static_clouds"]:
+            # Stop the clouds where they are now
+            background.freeze(sim.cloud_scroll)
+        else:
+            background.thaw()
+
+    set_quality(level)
+
     running = True
-    while running:
-        # Event handling
+
+    def handle_events():
+        # Game actions are stamped with the time they were read
+        nonlocal running
         for event in pygame.event.get():
+            if scaled:
+                event = display.remap_event(event)
             if event.type == pygame.QUIT:
                 running = False
-            
+
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
-                
-                if game_state == MENU:
-                    if event.key == pygame.K_RETURN:
-                        game_state = PLAYING
-                        player = Player()
-                        prompts = []
-                        particles = []
-                        score = 0
-                        game_speed = 1.0
-                
-                elif game_state == PLAYING:
-                    if event.key == pygame.K_SPACE:
-                        player.jump()
-                
-                elif game_state == GAME_OVER:
-                    if event.key == pygame.K_RETURN:
-                        game_state = PLAYING
-                        player = Player()
-                        prompts = []
-                        particles = []
-                        score = 0
-                        game_speed = 1.0
-        
-        # Update clouds in all game states
-        for cloud in clouds:
-            cloud.update()
-        
+                elif event.key == pygame.K_RETURN:
+                    inputs.push(ACTION_START)
+                elif event.key == pygame.K_SPACE:
+                    inputs.push(ACTION_JUMP)
+                elif event.key == pygame.K_F3:
+                    overlay.toggle()
+                    if dirty is not None:
+                        dirty.invalidate()
+
+    while running:
+        frame_started = time.perf_counter()
+        timer.begin_frame()
+
+        # Event handling
+        handle_events()
+        if race is not None:
+            race.poll()
+        timer.lap("events")
+
+        if sim_thread is None:
+            # Run as many fixed ticks as real time calls for. Each action goes
+            # to the tick covering the moment it was read, so actions read
+            # after the newest tick wait for the next frame.
+            ticks = timestep.advance()
+            for tick_time in timestep.tick_times(ticks):
+                frame = sim.frame
+                actions = inputs.take(tick_time, frame + 1)
+                result = sim.step(actions)
+                on_tick(frame, actions, result)
+            tick_rate.add(ticks)
+            view = sim
+            alpha = timestep.alpha
+        else:
+            # Draw the newest tick the simulation thread has finished
+            view = sim_thread.buffer.latest()
+            result = view.result
+            alpha = sim_thread.alpha(view)
+            if not sim_thread.is_alive():
+                running = False
+
         # Game state handling
-        if game_state == MENU:
-            show_menu()
-        
-        elif game_state == PLAYING:
-            # Update game speed
-            game_speed += GAME_SPEED_INCREASE
-            
-            # Update player
-            player.update()
-            
-            # Spawn prompts
-            spawn_counter += 1
-            if spawn_counter >= PROMPT_SPAWN_RATE / game_speed:
-                is_good = random.choice([True, False])
-                prompts.append(Prompt(SCREEN_WIDTH, is_good))
-                spawn_counter = 0
-            
-            # Update prompts
-            for prompt in prompts[:]:
-                prompt.update(game_speed)
-                
-                # Check for collisions
-                if check_collision(player, prompt):
-                    if prompt.is_good:
-                        score += 10
-                        if good_collect_sound:
-                            good_collect_sound.play()
-                        # Create particles for good prompts
-                        for _ in range(15):
-                            particles.append(Particle(prompt.x + prompt.width/2, 
-                                                    prompt.y + prompt.height/2, 
-                                                    GREEN))
-                    else:
-                        if bad_collect_sound:
-                            bad_collect_sound.play()
-                        # Create particles for bad prompts
-                        for _ in range(15):
-                            particles.append(Particle(prompt.x + prompt.width/2, 
-                                                    prompt.y + prompt.height/2, 
-                                                    RED))
-                        game_state = GAME_OVER
-                    prompts.remove(prompt)
-                
-                # Remove prompts that are off-screen
-                elif prompt.x + prompt.width < 0:
-                    prompts.remove(prompt)
-            
-            # Update particles
-            for particle in particles[:]:
-                particle.update()
-                if particle.life <= 0:
-                    particles.remove(particle)
-            
-            # Drawing
-            screen.fill(LIGHT_BLUE)
-            
-            # Draw clouds
-            for cloud in clouds:
-                cloud.draw(screen)
-            
-            # Draw ground
-            draw_ground()
-            
-            # Draw player
-            player.draw(screen)
-            
-            # Draw prompts
-            for prompt in prompts:
-                prompt.draw(screen)
-            
-            # Draw particles
-            for particle in particles:
-                particle.draw(screen)
-            
-            # Draw score
-            score_text = font_medium.render(f"Score: {score}", True, BLACK)
-            screen.blit(score_text, (20, 20))
-            
-            # Draw speed
-            speed_text = font_small.render(f"Speed: {game_speed:.2f}x", True, BLACK)
-            screen.blit(speed_text, (20, 70))
-            
-            pygame.display.flip()
-        
-        elif game_state == GAME_OVER:
-            show_game_over(score)
-        
-        # Cap the frame rate
-        clock.tick(60)
-    
+        if result.state != PLAYING and dirty is not None:
+            # Other screens redraw everything, so start over when play resumes
+            dirty.invalidate()
+
+        if result.state == MENU:
+            show_menu(view, background, alpha, timer, overlay)
+
+        elif result.state == PLAYING:
+            show_playing(view, result, background, dirty, alpha, timer, overlay,
+                         QUALITY_LEVELS[level], race.ghosts() if race is not None else ())
+
+        elif result.state == GAME_OVER:
+            if shown_state != GAME_OVER:
+                game_over.start(result.score)
+            game_over.draw()
+
+        if result.state != shown_state and sim_thread is None:
+            # Starting a run or showing the game over screen can block this
+            # thread; don't make the next ticks catch up with that time. The
+            # simulation thread is never blocked by the screens.
+            timestep.reset()
+        shown_state = result.state
+        latencies = inputs.presented(view.frame)
+
+        # Render as fast as allowed; the simulation speed does not depend on
+        # it. Input is read while waiting so it is stamped without delay.
+        timer.begin()
+        if max_fps:
+            deadline = frame_started + 1 / max_fps
+            while running:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, INPUT_POLL_INTERVAL))
+                handle_events()
+        timer.lap("wait")
+        frame_ns = timer.end_frame()
+        rendered_frames += 1
+        frame_rate.add()
+        shown_level = level
+
+        if governor is not None:
+            # Judge the time spent working, not waiting for the frame cap
+            level = governor.update(frame_ns - timer.phases.get("wait", 0))
+            if level != shown_level:
+                set_quality(level)
+        if rendered_frames == 1:
+            print(f"Time to first frame: {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+
+        if writer is not None:
+            # Built outside the measured frame; the file is written on another thread
+            row = {phase: ns / 1e6 for phase, ns in timer.phases.items()}
+            row.update(frame=rendered_frames, time_ms=pygame.time.get_ticks(),
+                       state=result.state, frame_ms=frame_ns / 1e6,
+                       tick_rate=overlay.tick_rate.rate,
+                       input_latency_ms=max(latencies) if latencies else 0,
+                       quality=shown_level,
+                       prompts=len(view.prompts),
+                       particles=len(view.particles), clouds=len(view.clouds))
+            writer.write(row)
+
+    if sim_thread is not None:
+        sim_thread.stop()
+        sim_thread.join()
+        print(f"Simulation: {sim_thread.tick_rate.average():.1f} ticks/s, "
+              f"rendering: {frame_rate.average():.1f} frames/s")
+    if inputs.latency.count:
+        latency = inputs.latency.summary()
+        print(f"Input to present latency: p50 {latency['p50_ms']:.0f} ms, "
+              f"p95 {latency['p95_ms']:.0f} ms over {latency['inputs']} inputs")
+        if writer is not None and not telemetry.endswith(".csv"):
+            writer.write({"input_latency": latency})
+    sim.gc_monitor.uninstall()
+    if race is not None:
+        race.close()
+    if writer is not None:
+        writer.close()
+    if store is not None:
+        store.close()
+    if recording is not None:
+        recording.save(record)
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    def parse_window_size(text):
+        # "1920x1080" -> (1920, 1080), for --window
+        try:
+            width, height = (int(value) for value in text.lower().split("x"))
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+        if width <= 0 or height <= 0:
+            raise argparse.ArgumentTypeError(f"window size must be positive, got {text!r}")
+        return width, height
+
+    def parse_address(text):
+        # "host:port" or "host" -> (host, port), for --server
+        host, _, port = text.rpartition(":")
+        if not host:
+            return text, DEFAULT_PORT
+        try:
+            return host, int(port)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"expected HOST[:PORT], got {text!r}")
+
+    parser = argparse.ArgumentParser(description="Prompt Runner")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="only redraw and present the areas that changed")
+    parser.add_argument("--max-fps", type=int, default=RENDER_FPS_CAP,
+                        help="render frame rate cap (0 for uncapped)")
+    parser.add_argument("--max-catch-up", type=int, default=5,
+                        help="most simulation ticks run for one slow frame")
+    parser.add_argument("--profile", action="store_true",
+                        help="start with the profiling overlay shown (F3 toggles it)")
+    parser.add_argument("--telemetry", metavar="FILE",
+                        help="stream per-frame timings to a .csv or .jsonl file")
+    parser.add_argument("--record", metavar="FILE",
+                        help="save the seed and every input to FILE (verify with replay.py)")
+    parser.add_argument("--quality", type=int, choices=range(len(QUALITY_LEVELS)), default=None,
+                        help="fixed level of detail, 0 (full) to 4 (flat); adapts if not set")
+    parser.add_argument("--frame-budget", type=float, default=FRAME_BUDGET_MS,
+                        help="frame time in ms the adaptive quality aims to stay under")
+    parser.add_argument("--window", metavar="WxH", type=parse_window_size,
+                        help="window size; the game is drawn at %dx%d and scaled to it"
+                             % (SCREEN_WIDTH, SCREEN_HEIGHT))
+    parser.add_argument("--fullscreen", action="store_true",
+                        help="scale the game to the whole screen")
+    parser.add_argument("--scale", choices=SCALE_MODES, default=FIT,
+                        help="fit: as large as fits; integer: whole multiples only")
+    parser.add_argument("--smooth", action="store_true",
+                        help="filter the scaled image instead of keeping sharp pixels")
+    parser.add_argument("--threaded", action="store_true",
+                        help="run the simulation on its own thread, apart from rendering")
+    parser.add_argument("--player", default=DEFAULT_PLAYER,
+                        help="name finished runs are saved under")
+    parser.add_argument("--scores", metavar="FILE", default=SCORES_FILE,
+                        help="high score database (empty to not save runs)")
+    parser.add_argument("--jump-buffer", type=float, default=JUMP_BUFFER_MS, metavar="MS",
+                        help="how early a jump may be pressed before landing")
+    parser.add_argument("--coyote-time", type=float, default=COYOTE_TIME_MS, metavar="MS",
+                        help="how long after leaving the ground a jump still counts")
+    parser.add_argument("--server", metavar="HOST[:PORT]", type=parse_address,
+                        help="join the ghost race on this server (see multiplayer.py)")
+    args = parser.parse_args()
+
+    main(seed=args.seed, dirty_rects=args.dirty_rects,
+         max_fps=args.max_fps, max_catch_up=args.max_catch_up,
+         profile=args.profile, telemetry=args.telemetry, record=args.record,
+         quality=args.quality, frame_budget=args.frame_budget,
+         window_size=args.window, fullscreen=args.fullscreen,
+         scale_mode=args.scale, smooth=args.smooth, threaded=args.threaded,
+         player=args.player, scores=args.scores,
+         jump_buffer_ms=args.jump_buffer, coyote_time_ms=args.coyote_time,
+         server=args.server)
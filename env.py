@@ -0,0 +1,147 @@
+import time
+import random
+import multiprocessing
+
+import numpy as np
+
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, GROUND_HEIGHT, PROMPT_WIDTH, PROMPT_HEIGHT,
+    GAME_OVER, ACTION_JUMP, ACTION_START,
+    GameSimulation, Player,
+)
+from collision import first_at_or_after
+
+# Gym-style environment for training and evaluating bots.
+# Each step is one simulation tick with no rendering. Episodes run in
+# separate processes with run_episodes(); they share nothing, so throughput
+# grows with the number of worker processes.
+
+NOOP = 0
+JUMP = 1
+NUM_ACTIONS = 2
+
+OBS_PROMPTS = 3  # nearest prompts (ahead of the player's back edge) in the observation
+OBS_SIZE = 4 + 4 * OBS_PROMPTS
+
+# Rewards are the score gained in the step, plus this when the player dies
+DEATH_REWARD = -10.0
+MAX_STEPS = 20000    # episodes are cut off (done) after this many steps
+
+class PromptRunnerEnv:
+    # reset(seed) -> observation; step(action) -> (observation, reward, done).
+    # Observations are float32 vectors of OBS_SIZE:
+    #   player y, vel_y, is_jumping, game_speed, then for each of the
+    #   OBS_PROMPTS nearest prompts: x distance, y, is_good, present
+    # Positions are divided by the screen size so values stay around 0..1.
+    def __init__(self, max_steps=MAX_STEPS):
+        self.max_steps = max_steps
+        self.sim = None
+        self.steps = 0
+
+    def reset(self, seed=None):
+        self.sim = GameSimulation(seed=seed, effects=False)
+        self.sim.step([ACTION_START])
+        self.steps = 0
+        return self.observation()
+
+    def step(self, action):
+        sim = self.sim
+        score = sim.score
+        result = sim.step((ACTION_JUMP,) if action == JUMP else ())
+        self.steps += 1
+
+        reward = float(result.score - score)
+        done = result.state == GAME_OVER
+        if done:
+            reward += DEATH_REWARD
+        elif self.steps >= self.max_steps:
+            done = True
+        return self.observation(), reward, done
+
+    def observation(self):
+        sim = self.sim
+        player = sim.player
+        obs = np.zeros(OBS_SIZE, dtype=np.float32)
+        obs[0] = player.y / SCREEN_HEIGHT
+        obs[1] = player.vel_y / SCREEN_HEIGHT
+        obs[2] = player.is_jumping
+        obs[3] = sim.game_speed
+
+        prompts = sim.prompts
+        start = first_at_or_after(prompts, player.x - PROMPT_WIDTH)
+        for i, prompt in enumerate(prompts[start:start + OBS_PROMPTS]):
+            base = 4 + 4 * i
+            obs[base] = (prompt.x - player.x) / SCREEN_WIDTH
+            obs[base + 1] = prompt.y / SCREEN_HEIGHT
+            obs[base + 2] = prompt.is_good
+            obs[base + 3] = 1.0
+        return obs
+
+# Policies take (observation, rng) and return an action. They must be
+# module-level functions so worker processes can unpickle them.
+
+def random_policy(obs, rng):
+    return JUMP if rng.random() < 0.05 else NOOP
+
+# Observed prompt y above which a bad prompt hits a player standing on the ground
+LOW_PROMPT_Y = (SCREEN_HEIGHT - GROUND_HEIGHT - Player().height - PROMPT_HEIGHT) / SCREEN_HEIGHT
+JUMP_DISTANCE = 0.16  # observed x distance at which to jump over one
+
+def heuristic_policy(obs, rng):
+    # Jump over the nearest bad prompt that would hit a running player
+    for i in range(OBS_PROMPTS):
+        base = 4 + 4 * i
+        if not obs[base + 3]:
+            break
+        if not obs[base + 2] and 0 < obs[base] < JUMP_DISTANCE and obs[base + 1] > LOW_PROMPT_Y:
+            return JUMP
+    return NOOP
+
+POLICIES = {"random": random_policy, "heuristic": heuristic_policy}
+
+def run_episode(task):
+    # One episode; `task` is (seed, policy, max_steps) so it can go through Pool.map
+    seed, policy, max_steps = task
+    env = PromptRunnerEnv(max_steps)
+    rng = random.Random(seed)
+    obs = env.reset(seed)
+    total_reward = 0.0
+    done = False
+    while not done:
+        obs, reward, done = env.step(policy(obs, rng))
+        total_reward += reward
+    return {"seed": seed, "steps": env.steps, "score": env.sim.score, "reward": total_reward}
+
+def run_episodes(episodes, workers=None, policy=heuristic_policy, seed=0, max_steps=MAX_STEPS):
+    # Spreads `episodes` episodes (seeds seed, seed + 1, ...) over a process
+    # pool and returns (results in seed order, total steps per second)
+    tasks = [(seed + i, policy, max_steps) for i in range(episodes)]
+    workers = workers or multiprocessing.cpu_count()
+    start = time.perf_counter()
+    if workers == 1:
+        results = [run_episode(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            chunksize = max(1, episodes // (workers * 4))
+            results = pool.map(run_episode, tasks, chunksize)
+    elapsed = time.perf_counter() - start
+    steps = sum(result["steps"] for result in results)
+    return results, steps / elapsed if elapsed > 0 else float("inf")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run Prompt Runner bot episodes in parallel")
+    parser.add_argument("--episodes", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="heuristic")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS)
+    args = parser.parse_args()
+
+    results, steps_per_second = run_episodes(args.episodes, args.workers, POLICIES[args.policy],
+                                             args.seed, args.max_steps)
+    scores = [result["score"] for result in results]
+    print(f"{args.episodes} episodes, {sum(r['steps'] for r in results)} steps "
+          f"at {steps_per_second:,.0f} steps/s")
+    print(f"Score: mean {sum(scores) / len(scores):.1f}, best {max(scores)}")
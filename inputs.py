@@ -0,0 +1,52 @@
+import time
+import threading
+from collections import deque
+
+from profiling import LatencyHistogram
+
+# Input pipeline.
+# Actions are stamped with the time they were read from the event queue and
+# wait for the simulation tick that covers that moment, so a press always
+# lands on the same tick however frames and ticks line up. Once the frame
+# showing that tick has been presented, the time from the press to the
+# present goes into a latency histogram.
+
+class InputPipeline:
+    # push() runs on the event thread, take() wherever the simulation ticks
+    # and presented() after each present; the lock makes that safe when the
+    # simulation has its own thread.
+    def __init__(self, histogram=None, clock=time.perf_counter):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.queued = deque()     # (action, time read)
+        self.in_flight = deque()  # (tick, time read) of actions not on screen yet
+        self.latency = histogram if histogram is not None else LatencyHistogram()
+
+    def push(self, action, stamp=None):
+        with self.lock:
+            self.queued.append((action, self.clock() if stamp is None else stamp))
+
+    def take(self, tick_time, tick):
+        # Actions read up to `tick_time`, for the tick that produces frame `tick`
+        actions = []
+        with self.lock:
+            queued = self.queued
+            while queued and queued[0][1] <= tick_time:
+                action, stamp = queued.popleft()
+                actions.append(action)
+                self.in_flight.append((tick, stamp))
+        return actions
+
+    def presented(self, frame):
+        # Call right after presenting simulation frame `frame`; returns the
+        # latencies (ms) of the actions that just reached the screen
+        now = self.clock()
+        latencies = []
+        with self.lock:
+            in_flight = self.in_flight
+            while in_flight and in_flight[0][0] <= frame:
+                _, stamp = in_flight.popleft()
+                latencies.append((now - stamp) * 1000)
+        for ms in latencies:
+            self.latency.add(ms)
+        return latencies
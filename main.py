@@ -1,20 +1,20 @@
+import time
+
+# Measured from as early as possible, for the time-to-first-frame report
+STARTED = time.perf_counter()
+
 import pygame
-import random
 import sys
-import os
 
-# Initialize pygame
-pygame.init()
-
-# Game constants
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-GROUND_HEIGHT = 50
-GRAVITY = 0.6
-JUMP_FORCE = -15
-PROMPT_SPEED = 5
-PROMPT_SPAWN_RATE = 60  # Frames between prompt spawns
-GAME_SPEED_INCREASE = 0.0001  # How much to increase speed per frame
+from simulation import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, GROUND_HEIGHT, FPS,
+    MENU, PLAYING, GAME_OVER,
+    ACTION_JUMP, ACTION_START,
+    GameSimulation,
+)
+from timestep import FixedTimestep
+from assets import load_font
+from replay import Recording
 
 # Colors
 WHITE = (255, 255, 255)
@@ -25,80 +25,47 @@ BLUE = (0, 0, 200)
 GRAY = (100, 100, 100)
 YELLOW = (255, 255, 0)
 
-# Set up the display
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Prompt Runner")
-clock = pygame.time.Clock()
-
-# Load fonts
-font_large = pygame.font.SysFont('Arial', 48)
-font_medium = pygame.font.SysFont('Arial', 36)
-font_small = pygame.font.SysFont('Arial', 24)
+# Display and fonts are created by init() rather than at import
+screen = None
+clock = None
+font_large = None
+font_medium = None
+font_small = None
 
-# Game states
-MENU = 0
-PLAYING = 1
-GAME_OVER = 2
-
-class Player:
-    def __init__(self):
-        self.width = 50
-        self.height = 80
-        self.x = 100
-        self.y = SCREEN_HEIGHT - GROUND_HEIGHT - self.height
-        self.vel_y = 0
-        self.is_jumping = False
-        self.color = BLUE
-    
-    def update(self):
-        # Apply gravity
-        self.vel_y += GRAVITY
-        self.y += self.vel_y
-        
-        # Check for ground collision
-        if self.y > SCREEN_HEIGHT - GROUND_HEIGHT - self.height:
-            self.y = SCREEN_HEIGHT - GROUND_HEIGHT - self.height
-            self.vel_y = 0
-            self.is_jumping = False
-    
-    def jump(self):
-        if not self.is_jumping:
-            self.vel_y = JUMP_FORCE
-            self.is_jumping = True
-    
-    def draw(self, screen):
-        pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
-        # Draw face
-        pygame.draw.circle(screen, WHITE, (self.x + 25, self.y + 20), 10)  # Left eye
-        pygame.draw.circle(screen, WHITE, (self.x + 40, self.y + 20), 10)  # Right eye
-        pygame.draw.circle(screen, BLACK, (self.x + 25, self.y + 20), 5)   # Left pupil
-        pygame.draw.circle(screen, BLACK, (self.x + 40, self.y + 20), 5)   # Right pupil
-        pygame.draw.arc(screen, BLACK, (self.x + 15, self.y + 30, 30, 20), 0, 3.14, 3)  # Smile
+def init():
+    global screen, clock, font_large, font_medium, font_small
+    if screen is not None:
+        return
+    
+    # Initialize pygame (this version has no sound)
+    pygame.display.init()
+    pygame.font.init()
+    
+    # Set up the display
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Prompt Runner")
+    clock = pygame.time.Clock()
+    
+    # Load fonts (resolved file paths are cached on disk)
+    font_large = load_font('Arial', 48)
+    font_medium = load_font('Arial', 36)
+    font_small = load_font('Arial', 24)
 
-class Prompt:
-    def __init__(self, x, is_good):
-        self.width = 80
-        self.height = 40
-        self.x = x
-        self.y = random.randint(100, SCREEN_HEIGHT - GROUND_HEIGHT - 100)
-        self.is_good = is_good
-        self.color = GREEN if is_good else RED
-        self.speed = PROMPT_SPEED
-        self.text = random.choice(["Good!", "Nice!", "Great!"] if is_good else ["Bad!", "Wrong!", "Avoid!"])
-    
-    def update(self, game_speed):
-        self.x -= self.speed * game_speed
-    
-    def draw(self, screen):
-        pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
-        text = font_small.render(self.text, True, WHITE)
-        text_rect = text.get_rect(center=(self.x + self.width/2, self.y + self.height/2))
-        screen.blit(text, text_rect)
+def draw_player(screen, player, color=BLUE):
+    pygame.draw.rect(screen, color, (player.x, player.y, player.width, player.height))
+    # Draw face
+    pygame.draw.circle(screen, WHITE, (player.x + 25, player.y + 20), 10)  # Left eye
+    pygame.draw.circle(screen, WHITE, (player.x + 40, player.y + 20), 10)  # Right eye
+    pygame.draw.circle(screen, BLACK, (player.x + 25, player.y + 20), 5)   # Left pupil
+    pygame.draw.circle(screen, BLACK, (player.x + 40, player.y + 20), 5)   # Right pupil
+    pygame.draw.arc(screen, BLACK, (player.x + 15, player.y + 30, 30, 20), 0, 3.14, 3)  # Smile
 
-def check_collision(player, prompt):
-    player_rect = pygame.Rect(player.x, player.y, player.width, player.height)
-    prompt_rect = pygame.Rect(prompt.x, prompt.y, prompt.width, prompt.height)
-    return player_rect.colliderect(prompt_rect)
+def draw_prompt(screen, prompt):
+    color = GREEN if prompt.is_good else RED
+    pygame.draw.rect(screen, color, (prompt.x, prompt.y, prompt.width, prompt.height))
+    text = font_small.render(prompt.text, True, WHITE)
+    text_rect = text.get_rect(center=(prompt.x + prompt.width/2, prompt.y + prompt.height/2))
+    screen.blit(text, text_rect)
 
 def draw_ground():
     pygame.draw.rect(screen, GRAY, (0, SCREEN_HEIGHT - GROUND_HEIGHT, SCREEN_WIDTH, GROUND_HEIGHT))
@@ -151,13 +118,33 @@ def show_game_over(score):
     
     pygame.display.flip()
 
-def main():
-    game_state = MENU
-    player = Player()
-    prompts = []
-    score = 0
-    spawn_counter = 0
-    game_speed = 1.0
+def show_playing(sim, result):
+    screen.fill(BLACK)
+    
+    # Draw score
+    score_text = font_medium.render(f"Score: {result.score}", True, WHITE)
+    screen.blit(score_text, (20, 20))
+    
+    # Draw speed
+    speed_text = font_small.render(f"Speed: {result.game_speed:.2f}x", True, WHITE)
+    screen.blit(speed_text, (20, 70))
+    
+    # Draw game elements
+    draw_ground()
+    draw_player(screen, sim.player)
+    for prompt in sim.prompts:
+        draw_prompt(screen, prompt)
+    
+    pygame.display.flip()
+
+def main(seed=None, record=None):
+    init()
+    sim = GameSimulation(seed=seed, effects=False)
+    recording = Recording(sim.seed) if record else None
+    timestep = FixedTimestep(FPS)
+    result = sim.result()
+    inputs = []
+    first_frame = True
     
     running = True
     while running:
@@ -169,88 +156,48 @@ def main():
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
-                
-                if game_state == MENU:
-                    if event.key == pygame.K_RETURN:
-                        game_state = PLAYING
-                        player = Player()
-                        prompts = []
-                        score = 0
-                        game_speed = 1.0
-                
-                elif game_state == PLAYING:
-                    if event.key == pygame.K_SPACE:
-                        player.jump()
-                
-                elif game_state == GAME_OVER:
-                    if event.key == pygame.K_RETURN:
-                        game_state = PLAYING
-                        player = Player()
-                        prompts = []
-                        score = 0
-                        game_speed = 1.0
+                elif event.key == pygame.K_RETURN:
+                    inputs.append(ACTION_START)
+                elif event.key == pygame.K_SPACE:
+                    inputs.append(ACTION_JUMP)
+        
+        # Advance the simulation by however many fixed ticks are due
+        for _ in range(timestep.advance()):
+            frame = sim.frame
+            result = sim.step(inputs)
+            if recording is not None:
+                recording.record_step(frame, inputs, result)
+            inputs = []
         
         # Game state handling
-        if game_state == MENU:
+        if result.state == MENU:
             show_menu()
         
-        elif game_state == PLAYING:
-            # Update game speed
-            game_speed += GAME_SPEED_INCREASE
-            
-            # Update player
-            player.update()
-            
-            # Spawn prompts
-            spawn_counter += 1
-            if spawn_counter >= PROMPT_SPAWN_RATE / game_speed:
-                is_good = random.choice([True, False])
-                prompts.append(Prompt(SCREEN_WIDTH, is_good))
-                spawn_counter = 0
-            
-            # Update prompts
-            for prompt in prompts[:]:
-                prompt.update(game_speed)
-                
-                # Check for collisions
-                if check_collision(player, prompt):
-                    if prompt.is_good:
-                        score += 10
-                    else:
-                        game_state = GAME_OVER
-                    prompts.remove(prompt)
-                
-                # Remove prompts that are off-screen
-                elif prompt.x + prompt.width < 0:
-                    prompts.remove(prompt)
-            
-            # Drawing
-            screen.fill(BLACK)
-            
-            # Draw score
-            score_text = font_medium.render(f"Score: {score}", True, WHITE)
-            screen.blit(score_text, (20, 20))
-            
-            # Draw speed
-            speed_text = font_small.render(f"Speed: {game_speed:.2f}x", True, WHITE)
-            screen.blit(speed_text, (20, 70))
-            
-            # Draw game elements
-            draw_ground()
-            player.draw(screen)
-            for prompt in prompts:
-                prompt.draw(screen)
-            
-            pygame.display.flip()
+        elif result.state == PLAYING:
+            show_playing(sim, result)
         
-        elif game_state == GAME_OVER:
-            show_game_over(score)
+        elif result.state == GAME_OVER:
+            show_game_over(result.score)
+        
+        if first_frame:
+            print(f"Time to first frame: {(time.perf_counter() - STARTED) * 1000:.0f} ms")
+            first_frame = False
         
         # Cap the frame rate
-        clock.tick(60)
+        clock.tick(FPS)
     
+    if recording is not None:
+        recording.save(record)
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Prompt Runner (basic version)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--record", metavar="FILE",
+                        help="save the seed and every input to FILE (verify with replay.py)")
+    args = parser.parse_args()
+    
+    main(seed=args.seed, record=args.record)
@@ -0,0 +1,557 @@
+import time
+import socket
+import asyncio
+import threading
+from collections import deque, namedtuple
+
+from simulation import (
+    FPS, PROMPT_SPEED, GAME_SPEED_INCREASE, SCREEN_HEIGHT, GROUND_HEIGHT,
+    MENU, PLAYING, GAME_OVER, ACTION_JUMP, ACTION_START,
+    GameSimulation, Player,
+)
+from replay import encode_varint, decode_varint, zigzag, unzigzag
+
+# Ghost races.
+# A small UDP server relays every player's runner to the others, who draw
+# them as ghosts. All clients play with the seed the server hands out, and
+# every run restarts the prompt stream from it, so a ghost's tick in its run
+# pins down exactly which prompts it is facing; the prompts themselves are
+# never sent.
+#
+# Clients send their state (run state, tick in the run, y, vel_y, score)
+# SNAPSHOT_RATE times a second and acknowledge the newest snapshot they got.
+# The server sends each client a snapshot of at most MAX_GHOSTS rivals (the
+# players closest to its score), delta-encoded against the last snapshot the
+# client acknowledged: unchanged ghosts are left out and changed fields are
+# sent as small differences of quantized values. A packet's size depends on
+# MAX_GHOSTS, not on the number of players, and building it only looks at
+# those rivals, so per-player bandwidth and server work stay flat however
+# many players join.
+#
+# Client messages (varints):
+#   HELLO: protocol version, name length, name (UTF-8)
+#   UPDATE: acknowledged snapshot, state, run tick, zigzag(y), zigzag(vel_y), score
+#   BYE
+# Server messages:
+#   WELCOME: protocol version, player id, zigzag(seed)
+#   SNAPSHOT: sequence, baseline sequence (0: none), removed count, ids,
+#             changed count, then per ghost: id, field mask, a zigzag delta
+#             per field in the mask (name length and name for FIELD_NAME)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 47800
+PROTOCOL_VERSION = 1
+
+SNAPSHOT_RATE = 20                      # snapshots a second, and client updates
+SEND_INTERVAL = FPS // SNAPSHOT_RATE    # ticks between client updates
+MAX_GHOSTS = 8                          # rivals in each snapshot
+HISTORY = 32                            # snapshots kept as delta baselines
+CLIENT_TIMEOUT = 5.0                    # seconds without an update before a player is dropped
+INTERPOLATION_DELAY = 2                 # snapshots ghosts are drawn behind the newest
+MAX_EXTRAPOLATION = 3                   # snapshots a ghost may be moved on past its newest
+MAX_NAME_BYTES = 32
+
+HELLO, UPDATE, BYE = 0, 1, 2
+WELCOME, SNAPSHOT = 0, 1
+
+# Fields of a player's state, quantized to integers
+STATE, RUN_TICK, Y, VEL_Y, SCORE = range(5)
+FIELD_COUNT = 5
+FIELD_NAME = 1 << FIELD_COUNT  # mask bit: the ghost's name follows its fields
+SIGNED_FIELDS = (Y, VEL_Y)     # zigzag-encoded in updates
+Y_SCALE = 2       # half pixels
+VEL_SCALE = 4     # quarter pixels per tick
+
+STATE_CODES = {MENU: 0, PLAYING: 1, GAME_OVER: 2}
+CODE_STATES = {code: state for state, code in STATE_CODES.items()}
+
+_template = Player()
+PLAYER_X = _template.x
+GROUND_Y = SCREEN_HEIGHT - GROUND_HEIGHT - _template.height
+ANIMATION_SPEED = _template.animation_speed
+
+def quantize(state, run_tick, y, vel_y, score):
+    return (STATE_CODES[state], run_tick, round(y * Y_SCALE), round(vel_y * VEL_SCALE), score)
+
+# Limits on what a client may report, so one bad client cannot upset the others
+MAX_RUN_TICK = FPS * 60 * 60 * 24
+Y_LIMIT = SCREEN_HEIGHT * Y_SCALE
+VEL_LIMIT = 100 * VEL_SCALE
+
+def sanitize(values):
+    # Clamped copy of quantized values received from a client, or None if
+    # its state is not one the game knows
+    state, run_tick, y, vel_y, score = values
+    if state not in CODE_STATES:
+        return None
+    return (state, min(run_tick, MAX_RUN_TICK), min(max(y, -Y_LIMIT), Y_LIMIT),
+            min(max(vel_y, -VEL_LIMIT), VEL_LIMIT), score)
+
+def run_distance(run_tick):
+    # How far the world has scrolled `run_tick` ticks into a run (the game
+    # speed grows by the same amount every tick)
+    return PROMPT_SPEED * (run_tick + GAME_SPEED_INCREASE * run_tick * (run_tick + 1) / 2)
+
+def clip_name(name):
+    return name.encode("utf-8")[:MAX_NAME_BYTES].decode("utf-8", "ignore")
+
+def write_name(name, out):
+    data = name.encode("utf-8")
+    encode_varint(len(data), out)
+    out += data
+
+def read_name(data, pos):
+    length, pos = decode_varint(data, pos)
+    if pos + length > len(data):
+        raise ValueError("truncated packet")
+    return bytes(data[pos:pos + length]).decode("utf-8"), pos + length
+
+def encode_snapshot(seq, base_seq, base, ghosts):
+    # `ghosts` and `base` map player id -> (values, name); `base` is what the
+    # client already has for `base_seq` (None for a full snapshot)
+    out = bytearray((SNAPSHOT,))
+    encode_varint(seq, out)
+    encode_varint(base_seq, out)
+    base = base or {}
+    removed = [ghost_id for ghost_id in base if ghost_id not in ghosts]
+    encode_varint(len(removed), out)
+    for ghost_id in removed:
+        encode_varint(ghost_id, out)
+
+    changed = bytearray()
+    count = 0
+    for ghost_id, (values, name) in ghosts.items():
+        old = base.get(ghost_id)
+        if old is None:
+            old_values = (0,) * FIELD_COUNT
+            mask = FIELD_NAME
+        else:
+            old_values = old[0]
+            mask = 0
+        for field in range(FIELD_COUNT):
+            if values[field] != old_values[field]:
+                mask |= 1 << field
+        if not mask:
+            continue
+        count += 1
+        encode_varint(ghost_id, changed)
+        encode_varint(mask, changed)
+        for field in range(FIELD_COUNT):
+            if mask & 1 << field:
+                encode_varint(zigzag(values[field] - old_values[field]), changed)
+        if mask & FIELD_NAME:
+            write_name(name, changed)
+    encode_varint(count, out)
+    out += changed
+    return bytes(out)
+
+def decode_snapshot(data, baselines):
+    # Returns (seq, ghosts) from a SNAPSHOT packet; `baselines` maps the
+    # sequences the client still has to their ghosts. Raises KeyError when
+    # the baseline is gone and ValueError for a malformed packet.
+    pos = 1
+    seq, pos = decode_varint(data, pos)
+    base_seq, pos = decode_varint(data, pos)
+    ghosts = dict(baselines[base_seq]) if base_seq else {}
+    removed, pos = decode_varint(data, pos)
+    for _ in range(removed):
+        ghost_id, pos = decode_varint(data, pos)
+        ghosts.pop(ghost_id, None)
+    count, pos = decode_varint(data, pos)
+    for _ in range(count):
+        ghost_id, pos = decode_varint(data, pos)
+        mask, pos = decode_varint(data, pos)
+        old = ghosts.get(ghost_id)
+        if old is None and not mask & FIELD_NAME:
+            raise ValueError("delta for a ghost missing from the baseline")
+        values = list(old[0]) if old is not None and not mask & FIELD_NAME else [0] * FIELD_COUNT
+        for field in range(FIELD_COUNT):
+            if mask & 1 << field:
+                delta, pos = decode_varint(data, pos)
+                values[field] += unzigzag(delta)
+        if mask & FIELD_NAME:
+            name, pos = read_name(data, pos)
+        else:
+            name = old[1]
+        ghosts[ghost_id] = (tuple(values), name)
+    return seq, ghosts
+
+class RemotePlayer:
+    __slots__ = ("id", "address", "name", "values", "acked", "seq", "history", "last_heard")
+
+    def __init__(self, player_id, address, name, now):
+        self.id = player_id
+        self.address = address
+        self.name = name
+        self.values = None  # quantized state, None until the first update
+        self.acked = 0      # newest snapshot the client has confirmed
+        self.seq = 0
+        self.history = {}   # seq -> ghosts sent, the possible delta baselines
+        self.last_heard = now
+
+class RaceServer(asyncio.DatagramProtocol):
+    # Serves one race on the running asyncio loop; run() sends the snapshots
+    def __init__(self, seed, max_ghosts=MAX_GHOSTS, snapshot_rate=SNAPSHOT_RATE,
+                 clock=time.perf_counter):
+        self.seed = seed
+        self.max_ghosts = max_ghosts
+        self.interval = 1 / snapshot_rate
+        self.clock = clock
+        self.transport = None
+        self.players = {}  # address -> RemotePlayer
+        self.ranks = {}    # player id -> place by score, rebuilt every tick
+        self.next_id = 1
+        # Totals for reporting
+        self.ticks = 0
+        self.tick_seconds = 0.0
+        self.bytes_sent = 0
+        self.bad_packets = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        try:
+            self.handle(data, address)
+        except (ValueError, IndexError, KeyError):
+            self.bad_packets += 1
+
+    def handle(self, data, address):
+        kind = data[0]
+        player = self.players.get(address)
+        if kind == HELLO:
+            version, pos = decode_varint(data, 1)
+            if version != PROTOCOL_VERSION:
+                return
+            if player is None:
+                name, _ = read_name(data, pos)
+                player = RemotePlayer(self.next_id, address, clip_name(name) or "Ghost",
+                                      self.clock())
+                self.players[address] = player
+                self.next_id += 1
+            # Sent again for every HELLO, in case the first one was lost
+            out = bytearray((WELCOME,))
+            for value in (PROTOCOL_VERSION, player.id, zigzag(self.seed)):
+                encode_varint(value, out)
+            self.send(out, address)
+        elif player is None:
+            return
+        elif kind == UPDATE:
+            pos = 1
+            fields = []
+            for _ in range(FIELD_COUNT + 1):
+                value, pos = decode_varint(data, pos)
+                fields.append(value)
+            acked = fields[0]
+            if acked > player.acked:
+                player.acked = acked
+            for field in SIGNED_FIELDS:
+                fields[1 + field] = unzigzag(fields[1 + field])
+            values = sanitize(fields[1:])
+            if values is None:
+                self.bad_packets += 1
+                return
+            player.values = values
+            player.last_heard = self.clock()
+        elif kind == BYE:
+            del self.players[address]
+
+    def send(self, packet, address):
+        self.bytes_sent += len(packet)
+        self.transport.sendto(packet, address)
+
+    def rivals(self, player, ranked):
+        # The up to max_ghosts players ranked next to `player` by score
+        count = self.max_ghosts
+        if player.values is None:
+            return ranked[:count]
+        rank = self.ranks[player.id]
+        start = min(max(rank - count // 2, 0), max(len(ranked) - count - 1, 0))
+        window = ranked[start:start + count + 1]
+        return [rival for rival in window if rival is not player][:count]
+
+    def tick(self):
+        started = self.clock()
+        for address in [address for address, player in self.players.items()
+                        if started - player.last_heard > CLIENT_TIMEOUT]:
+            del self.players[address]
+
+        ranked = sorted((player for player in self.players.values() if player.values is not None),
+                        key=lambda player: (-player.values[SCORE], player.id))
+        self.ranks = {player.id: rank for rank, player in enumerate(ranked)}
+        for player in self.players.values():
+            ghosts = {rival.id: (rival.values, rival.name) for rival in self.rivals(player, ranked)}
+            player.seq += 1
+            base_seq = player.acked if player.acked in player.history else 0
+            self.send(encode_snapshot(player.seq, base_seq, player.history.get(base_seq), ghosts),
+                      player.address)
+            player.history[player.seq] = ghosts
+            player.history.pop(player.seq - HISTORY, None)
+        self.ticks += 1
+        self.tick_seconds += self.clock() - started
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            self.tick()
+            next_tick += self.interval
+            await asyncio.sleep(max(next_tick - loop.time(), 0))
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, seed=0, max_ghosts=MAX_GHOSTS,
+                server=None, started=None):
+    # Runs a race server until cancelled; `started` (a threading.Event) is
+    # set once the socket is bound
+    loop = asyncio.get_running_loop()
+    server = server or RaceServer(seed, max_ghosts)
+    transport, _ = await loop.create_datagram_endpoint(lambda: server, local_addr=(host, port))
+    if started is not None:
+        started.set()
+    try:
+        await server.run()
+    finally:
+        transport.close()
+
+# A remote player as the renderer sees it; it has the attributes draw_player
+# reads from Player
+Ghost = namedtuple("Ghost", ("id", "name", "x", "y", "is_jumping", "animation_frame",
+                             "score", "state", "run_tick"))
+
+class GhostTrack:
+    __slots__ = ("name", "samples")
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = deque(maxlen=INTERPOLATION_DELAY + MAX_EXTRAPOLATION + 4)  # (seq, values)
+
+class RaceClient:
+    # The game side. A plain non-blocking socket polled from the game loop,
+    # so the game needs no event loop; send_state() may run on the
+    # simulation thread while poll() runs on the main thread.
+    def __init__(self, address, name, clock=time.perf_counter):
+        self.clock = clock
+        self.name = clip_name(name)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect(address)
+        self.sock.setblocking(False)
+        self.interval = 1 / SNAPSHOT_RATE
+        self.player_id = None
+        self.seed = None
+        self.latest = 0       # newest snapshot received
+        self.baselines = {}   # seq -> ghosts of the snapshots still usable as baselines
+        self.tracks = {}      # ghost id -> GhostTrack
+        self.offset = None    # local time of snapshot 0, from the fastest packet seen
+        self.bytes_received = 0
+        self.lock = threading.Lock()  # guards `tracks`, read while drawing
+
+    def join(self, timeout=2.0):
+        # Says hello until the server answers; returns the race seed, or None
+        # if no server answered in time
+        hello = bytearray((HELLO,))
+        encode_varint(PROTOCOL_VERSION, hello)
+        write_name(self.name, hello)
+        deadline = self.clock() + timeout
+        while self.clock() < deadline:
+            self._send(hello)
+            time.sleep(0.1)
+            self.poll()
+            if self.seed is not None:
+                return self.seed
+        return None
+
+    def send_state(self, state, run_tick, y, vel_y, score):
+        out = bytearray((UPDATE,))
+        encode_varint(self.latest, out)
+        values = quantize(state, run_tick, y, vel_y, score)
+        for field, value in enumerate(values):
+            encode_varint(zigzag(value) if field in SIGNED_FIELDS else value, out)
+        self._send(out)
+
+    def close(self):
+        self._send(bytes((BYE,)))
+        self.sock.close()
+
+    def _send(self, data):
+        try:
+            self.sock.send(data)
+        except OSError:
+            pass  # the server is gone or not up yet; UDP has nothing to retry
+
+    def poll(self):
+        # Reads every packet that has arrived
+        while True:
+            try:
+                data = self.sock.recv(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # e.g. ICMP port unreachable while no server is running
+            self.bytes_received += len(data)
+            try:
+                if data[0] == WELCOME:
+                    version, pos = decode_varint(data, 1)
+                    if version == PROTOCOL_VERSION:
+                        self.player_id, pos = decode_varint(data, pos)
+                        seed, _ = decode_varint(data, pos)
+                        self.seed = unzigzag(seed)
+                elif data[0] == SNAPSHOT:
+                    self.receive(data)
+            except (ValueError, KeyError, IndexError):
+                pass  # malformed, or its baseline is gone; the next one will do
+
+    def receive(self, data):
+        seq, ghosts = decode_snapshot(data, self.baselines)
+        if seq <= self.latest:
+            return  # arrived out of order
+        self.latest = seq
+        self.baselines[seq] = ghosts
+        # Snapshots can be lost, so drop every baseline that got too old
+        for old_seq in [old_seq for old_seq in self.baselines if old_seq <= seq - HISTORY]:
+            del self.baselines[old_seq]
+
+        arrival = self.clock() - seq * self.interval
+        if self.offset is None or arrival < self.offset:
+            self.offset = arrival
+        with self.lock:
+            for ghost_id in [ghost_id for ghost_id in self.tracks if ghost_id not in ghosts]:
+                del self.tracks[ghost_id]
+            for ghost_id, (values, name) in ghosts.items():
+                track = self.tracks.get(ghost_id)
+                if track is None:
+                    track = self.tracks[ghost_id] = GhostTrack(name)
+                track.samples.append((seq, values))
+
+    def ghosts(self):
+        # Every ghost, placed INTERPOLATION_DELAY snapshots in the past and
+        # interpolated between the two snapshots around that moment
+        if self.offset is None:
+            return []
+        at = (self.clock() - self.offset) / self.interval - INTERPOLATION_DELAY
+        ghosts = []
+        with self.lock:
+            for ghost_id, track in self.tracks.items():
+                ghost = self._place(ghost_id, track, at)
+                if ghost is not None:
+                    ghosts.append(ghost)
+        return ghosts
+
+    def _place(self, ghost_id, track, at):
+        # None for a ghost in a state this client does not know (a newer
+        # server, or a damaged packet), which is then not drawn
+        samples = track.samples
+        older = samples[0]
+        newer = None
+        for sample in samples:
+            if sample[0] <= at:
+                older = sample
+            else:
+                newer = sample
+                break
+        seq, values = older
+        state = CODE_STATES.get(values[STATE])
+        if state is None:
+            return None
+        y = values[Y] / Y_SCALE
+        run_tick = values[RUN_TICK]
+        if newer is not None and newer[1][STATE] == values[STATE] and at > seq:
+            t = (at - seq) / (newer[0] - seq)
+            y += (newer[1][Y] / Y_SCALE - y) * t
+            run_tick += (newer[1][RUN_TICK] - run_tick) * t
+        elif newer is None and values[STATE] == STATE_CODES[PLAYING]:
+            # Packets are late: carry on for a little while at the last speed
+            ticks = min(at - seq, MAX_EXTRAPOLATION) * SEND_INTERVAL
+            y = min(y + values[VEL_Y] / VEL_SCALE * ticks, GROUND_Y)
+            run_tick += ticks
+        return Ghost(ghost_id, track.name, PLAYER_X, y, y < GROUND_Y - 0.5,
+                     run_tick * ANIMATION_SPEED % 4, values[SCORE], state, run_tick)
+
+def bench(player_counts, seconds=3.0, max_ghosts=MAX_GHOSTS):
+    # Runs a server and `count` bot clients over localhost UDP for each count;
+    # returns rows of (players, bytes/s per client, server ms per tick,
+    # server µs per player per tick)
+    rows = []
+    for count in player_counts:
+        server = RaceServer(seed=1, max_ghosts=max_ghosts)
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        task = loop.create_task(serve(port=0, server=server, started=started))
+
+        def run_server():
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=run_server, daemon=True)
+        thread.start()
+        started.wait()
+        address = server.transport.get_extra_info("sockname")
+
+        clients = [RaceClient(address, f"bot{i}") for i in range(count)]
+        for client in clients:
+            client.join()
+        bots = [GameSimulation(seed=1, effects=False, reseed_runs=True) for _ in clients]
+        for i, bot in enumerate(bots):
+            bot.step([ACTION_START])
+            for _ in range(i * 7):  # spread the bots out over the run
+                bot.step()
+
+        received = [client.bytes_received for client in clients]
+        ticks, tick_seconds = server.ticks, server.tick_seconds
+        next_send = started_at = time.perf_counter()
+        tick = 0
+        while time.perf_counter() - started_at < seconds:
+            for i, (client, bot) in enumerate(zip(clients, bots)):
+                for _ in range(SEND_INTERVAL):
+                    tick += 1
+                    jump = (tick + i * 13) % 37 == 0
+                    if bot.step([ACTION_JUMP] if jump else []).state == GAME_OVER:
+                        bot.step([ACTION_START])
+                client.send_state(bot.state, bot.play_frame, bot.player.y, bot.player.vel_y,
+                                  bot.score)
+                client.poll()
+            next_send += 1 / SNAPSHOT_RATE
+            time.sleep(max(next_send - time.perf_counter(), 0))
+        elapsed = time.perf_counter() - started_at
+        for client in clients:
+            client.poll()
+
+        sent = sum(client.bytes_received for client in clients) - sum(received)
+        server_ticks = server.ticks - ticks
+        per_tick = (server.tick_seconds - tick_seconds) / max(server_ticks, 1)
+        rows.append((count, sent / count / elapsed, per_tick * 1000, per_tick / count * 1e6))
+
+        for client in clients:
+            client.close()
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join()
+        loop.close()
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a Prompt Runner ghost race server")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--seed", type=int, default=None, help="race seed (default: random)")
+    parser.add_argument("--max-ghosts", type=int, default=MAX_GHOSTS,
+                        help="rivals sent to each player")
+    parser.add_argument("--bench", metavar="N,N,...",
+                        help="instead of serving, measure bandwidth and server time "
+                             "with this many bot players")
+    args = parser.parse_args()
+
+    if args.bench:
+        print(f"{'players':>8} {'bytes/s per client':>19} {'server ms/tick':>15} "
+              f"{'µs per player':>14}")
+        for count, rate, tick_ms, player_us in bench(
+                [int(count) for count in args.bench.split(",")], max_ghosts=args.max_ghosts):
+            print(f"{count:>8} {rate:>19.0f} {tick_ms:>15.3f} {player_us:>14.1f}")
+    else:
+        seed = args.seed if args.seed is not None else GameSimulation().seed
+        print(f"Ghost race server on {args.host}:{args.port}, seed {seed}")
+        try:
+            asyncio.run(serve(args.host, args.port, seed, args.max_ghosts))
+        except KeyboardInterrupt:
+            pass
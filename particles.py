@@ -0,0 +1,93 @@
+import numpy as np
+
+# Struct-of-arrays particle engine.
+# Live particles always occupy the first `count` slots of preallocated NumPy
+# arrays, so updating is one vectorized pass and dead particles are removed
+# with a single boolean compaction instead of per-object list.remove calls.
+
+PARTICLE_GRAVITY = 0.2
+PARTICLE_LIFE = 30  # frames
+PARTICLE_SHRINK = 0.1
+PARTICLE_CAPACITY = 65536
+
+# Values stored in ParticleSystem.kind
+KIND_GOOD = 1
+KIND_BAD = 0
+
+class ParticleSystem:
+    def __init__(self, capacity=PARTICLE_CAPACITY, seed=None):
+        self.capacity = capacity
+        self.count = 0
+        self.dropped = 0  # particles not emitted because the buffer was full
+        self.rng = np.random.default_rng(seed)
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vel_x = np.zeros(capacity, dtype=np.float32)
+        self.vel_y = np.zeros(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, x, y, is_good, count):
+        # Spawn `count` particles at (x, y); anything past capacity is dropped
+        start = self.count
+        end = min(start + count, self.capacity)
+        n = end - start
+        self.dropped += count - n
+        if n <= 0:
+            return
+
+        rng = self.rng
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.vel_x[start:end] = rng.uniform(-3, 3, n)
+        self.vel_y[start:end] = rng.uniform(-5, -1, n)
+        self.size[start:end] = rng.integers(3, 8, n, endpoint=True)
+        self.life[start:end] = PARTICLE_LIFE
+        self.kind[start:end] = KIND_GOOD if is_good else KIND_BAD
+        self.count = end
+
+    def update(self, dt=1):
+        n = self.count
+        if n == 0:
+            return
+
+        x = self.x[:n]
+        y = self.y[:n]
+        vel_y = self.vel_y[:n]
+        size = self.size[:n]
+        life = self.life[:n]
+
+        if dt == 1:
+            x += self.vel_x[:n]
+            y += vel_y
+            vel_y += PARTICLE_GRAVITY
+        else:
+            x += self.vel_x[:n] * dt
+            y += vel_y * dt + PARTICLE_GRAVITY * dt * (dt - 1) / 2
+            vel_y += PARTICLE_GRAVITY * dt
+        life -= dt
+        size -= PARTICLE_SHRINK * dt
+        np.maximum(size, 0, out=size)
+
+        # Compact survivors to the front of the buffers in one pass
+        alive = life > 0
+        alive_count = int(np.count_nonzero(alive))
+        if alive_count == n:
+            return
+        for array in (self.x, self.y, self.vel_x, self.vel_y, self.size, self.life, self.kind):
+            live = array[:n][alive]
+            array[:alive_count] = live
+        self.count = alive_count
+
+    def live(self):
+        # Views of the live particles for rendering: x, y, radius and kind
+        n = self.count
+        return (self.x[:n].astype(np.int32), self.y[:n].astype(np.int32),
+                self.size[:n].astype(np.int32), self.kind[:n])
@@ -0,0 +1,133 @@
+import time
+import threading
+from collections import namedtuple
+
+from simulation import FPS
+from timestep import FixedTimestep
+from profiling import RateCounter
+
+# Pipelined simulation and rendering.
+# A SimulationThread runs the fixed-timestep game loop on its own thread and
+# publishes an immutable Snapshot of everything the renderer needs after each
+# batch of ticks. The main thread handles events and draws the newest snapshot
+# (pygame wants both on the main thread); blits and fills release the GIL, so
+# on a multi-core machine the next ticks run while a frame is rasterized.
+#
+# Snapshots have the same attributes the renderer reads from GameSimulation,
+# so the drawing code takes either one.
+
+PlayerSnapshot = namedtuple("PlayerSnapshot", (
+    "x", "y", "prev_y", "width", "height", "is_jumping", "animation_frame"))
+
+PromptSnapshot = namedtuple("PromptSnapshot", (
+    "x", "prev_x", "y", "width", "height", "is_good", "text", "rotation", "pulse_size"))
+
+class ParticleSnapshot:
+    # Read-only copy of the live particles, with ParticleSystem's render API
+    __slots__ = ("arrays",)
+
+    def __init__(self, particles):
+        arrays = tuple(array.copy() for array in particles.live())
+        for array in arrays:
+            array.flags.writeable = False
+        self.arrays = arrays
+
+    def __len__(self):
+        return len(self.arrays[0])
+
+    def live(self):
+        return self.arrays
+
+class Snapshot:
+    __slots__ = ("time", "frame", "play_frame", "state", "result", "player", "prompts", "particles",
+                 "clouds", "cloud_scroll", "prev_cloud_scroll",
+                 "ground_scroll", "prev_ground_scroll")
+
+    def __init__(self, sim, result, now):
+        # `now` is when the newest tick in it was run
+        self.time = now
+        self.frame = sim.frame
+        self.play_frame = sim.play_frame
+        self.state = sim.state
+        self.result = result
+        player = sim.player
+        self.player = PlayerSnapshot(player.x, player.y, player.prev_y, player.width,
+                                     player.height, player.is_jumping, player.animation_frame)
+        self.prompts = tuple(PromptSnapshot(prompt.x, prompt.prev_x, prompt.y, prompt.width,
+                                            prompt.height, prompt.is_good, prompt.text,
+                                            prompt.rotation, prompt.pulse_size)
+                             for prompt in sim.prompts)
+        self.particles = ParticleSnapshot(sim.particles)
+        self.clouds = tuple(sim.clouds)  # clouds never change after they are created
+        self.cloud_scroll = sim.cloud_scroll
+        self.prev_cloud_scroll = sim.prev_cloud_scroll
+        self.ground_scroll = sim.ground_scroll
+        self.prev_ground_scroll = sim.prev_ground_scroll
+
+class SnapshotBuffer:
+    # Triple buffer: the simulation builds the next snapshot (back) while the
+    # renderer draws its current one (front); publish() swaps the finished one
+    # into the middle slot, replacing an unread one. Neither side ever waits
+    # for the other, and the renderer always gets the newest complete tick.
+    def __init__(self, snapshot):
+        self.lock = threading.Lock()
+        self.front = snapshot
+        self.middle = None
+        self.published = 0
+        self.dropped = 0  # snapshots replaced before the renderer saw them
+
+    def publish(self, snapshot):
+        with self.lock:
+            if self.middle is not None:
+                self.dropped += 1
+            self.middle = snapshot
+            self.published += 1
+
+    def latest(self):
+        with self.lock:
+            if self.middle is not None:
+                self.front = self.middle
+                self.middle = None
+            return self.front
+
+class SimulationThread(threading.Thread):
+    # Steps `sim` at `tick_rate` until stop(), taking each tick's actions from
+    # `inputs` (an InputPipeline the main thread pushes to);
+    # `on_tick(frame, inputs, result)` runs after every tick on this thread
+    # (recording, sounds).
+    def __init__(self, sim, inputs, on_tick=None, tick_rate=FPS, max_catch_up=5,
+                 clock=time.perf_counter):
+        super().__init__(name="simulation", daemon=True)
+        self.sim = sim
+        self.inputs = inputs
+        self.on_tick = on_tick
+        self.clock = clock
+        self.timestep = FixedTimestep(tick_rate, max_catch_up, clock)
+        self.stopped = threading.Event()
+        self.buffer = SnapshotBuffer(Snapshot(sim, sim.result(), clock()))
+        self.tick_rate = RateCounter(clock=clock)
+
+    def stop(self):
+        self.stopped.set()
+
+    def alpha(self, snapshot):
+        # How far the renderer is between the snapshot's last two ticks
+        return min((self.clock() - snapshot.time) / self.timestep.dt, 1.0)
+
+    def run(self):
+        sim = self.sim
+        timestep = self.timestep
+        inputs = self.inputs
+        while not self.stopped.is_set():
+            ticks = timestep.advance()
+            for tick_time in timestep.tick_times(ticks):
+                frame = sim.frame
+                actions = inputs.take(tick_time, frame + 1)
+                result = sim.step(actions)
+                if self.on_tick is not None:
+                    self.on_tick(frame, actions, result)
+            if ticks:
+                self.tick_rate.add(ticks)
+                self.buffer.publish(Snapshot(sim, result, self.clock()))
+            # Sleep until the next tick is due
+            self.stopped.wait(max(timestep.dt - timestep.accumulator, 0))
@@ -0,0 +1,80 @@
+import gc
+import time
+
+# Free-list object pools and GC pause accounting.
+# Entities that are spawned and retired constantly (prompts) are recycled
+# instead of reallocated, which keeps allocation churn and GC work low over
+# long sessions.
+
+class ObjectPool:
+    def __init__(self, factory, max_free=256):
+        self.factory = factory
+        self.max_free = max_free
+        self.free = []
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+
+    def acquire(self, *args):
+        # Returns a retired object re-initialized with `args`, or a new one
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args)
+            self.reused += 1
+            return obj
+        self.created += 1
+        return self.factory(*args)
+
+    def release(self, obj):
+        self.released += 1
+        if len(self.free) < self.max_free:
+            self.free.append(obj)
+
+    def release_all(self, objs):
+        for obj in objs:
+            self.release(obj)
+
+    def stats(self):
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "released": self.released,
+            "free": len(self.free),
+        }
+
+class GCMonitor:
+    # Measures garbage collector pauses through gc.callbacks
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.pause_ns = 0
+        self.max_pause_ns = 0
+        self._started = None
+        self.installed = False
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._started = time.perf_counter_ns()
+        elif self._started is not None:
+            pause = time.perf_counter_ns() - self._started
+            self._started = None
+            self.collections[info["generation"]] += 1
+            self.pause_ns += pause
+            self.max_pause_ns = max(self.max_pause_ns, pause)
+
+    def install(self):
+        if not self.installed:
+            gc.callbacks.append(self._callback)
+            self.installed = True
+        return self
+
+    def uninstall(self):
+        if self.installed:
+            gc.callbacks.remove(self._callback)
+            self.installed = False
+
+    def stats(self):
+        return {
+            "collections": list(self.collections),
+            "pause_ms": self.pause_ns / 1e6,
+            "max_pause_ms": self.max_pause_ns / 1e6,
+        }
@@ -0,0 +1,205 @@
+import csv
+import json
+import time
+import queue
+import threading
+from collections import deque
+
+# Per-frame phase timings.
+# Code under measurement calls begin() where a measured stretch starts and
+# lap(phase) at the end of each phase; the time since the previous call is
+# added to that phase for the current frame.
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+class PhaseTimer:
+    def __init__(self, history=None):
+        self.frames = deque(maxlen=history)  # (frame_ns, {phase: ns}) per frame
+        self.phases = {}
+        self.frame_start = 0
+        self.last = 0
+
+    def begin_frame(self):
+        self.frame_start = self.last = time.perf_counter_ns()
+        self.phases = {}
+
+    def begin(self):
+        self.last = time.perf_counter_ns()
+
+    def lap(self, phase):
+        now = time.perf_counter_ns()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self.last
+        self.last = now
+
+    def end_frame(self):
+        frame_ns = time.perf_counter_ns() - self.frame_start
+        self.frames.append((frame_ns, self.phases))
+        return frame_ns
+
+    def clear(self):
+        self.frames.clear()
+
+    def summary(self):
+        # Milliseconds: frame time percentiles plus mean and p95 per phase
+        frame_ms = sorted(frame_ns / 1e6 for frame_ns, _ in self.frames)
+        count = len(frame_ms)
+        summary = {
+            "frames": count,
+            "frame_ms": {
+                "mean": sum(frame_ms) / count if count else 0.0,
+                "p50": percentile(frame_ms, 50),
+                "p95": percentile(frame_ms, 95),
+                "p99": percentile(frame_ms, 99),
+                "max": frame_ms[-1] if count else 0.0,
+            },
+            "phases_ms": {},
+        }
+
+        names = []
+        for _, phases in self.frames:
+            for name in phases:
+                if name not in names:
+                    names.append(name)
+        for name in names:
+            values = sorted(phases.get(name, 0) / 1e6 for _, phases in self.frames)
+            summary["phases_ms"][name] = {
+                "mean": sum(values) / count,
+                "p95": percentile(values, 95),
+            }
+        return summary
+
+class TelemetryWriter:
+    # Streams per-frame records to a CSV or JSONL file (chosen by extension)
+    # from a background thread, so file I/O never lands inside a measured frame
+    def __init__(self, path, fields):
+        self.path = path
+        self.fields = list(fields)  # CSV columns; JSONL records are written whole
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        self.queue.put(record)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        with open(self.path, "w", newline="") as f:
+            if self.path.endswith(".csv"):
+                writer = csv.DictWriter(f, self.fields, restval=0, extrasaction="ignore")
+                writer.writeheader()
+                write = writer.writerow
+            else:
+                write = lambda record: f.write(json.dumps(record) + "\n")
+
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    break
+                write(record)
+
+class QualityGovernor:
+    # Picks a level of detail (0 = full) from a rolling average of frame
+    # time: one level down when the average is over budget, one level back up
+    # when it stays under `headroom` of the budget. After every change the
+    # window refills before the next decision, so a change has time to show.
+    def __init__(self, budget_ms, levels, window=30, headroom=0.6, level=0):
+        self.budget_ns = budget_ms * 1e6
+        self.max_level = levels - 1
+        self.headroom = headroom
+        self.samples = deque(maxlen=window)
+        self.level = level
+        self.changes = 0
+
+    def update(self, frame_ns):
+        # Feed one frame's busy time; returns the level to draw the next frame at
+        samples = self.samples
+        samples.append(frame_ns)
+        if len(samples) < samples.maxlen:
+            return self.level
+
+        average = sum(samples) / len(samples)
+        if average > self.budget_ns and self.level < self.max_level:
+            self._change(1)
+        elif average < self.budget_ns * self.headroom and self.level > 0:
+            self._change(-1)
+        return self.level
+
+    def _change(self, step):
+        self.level += step
+        self.changes += 1
+        self.samples.clear()
+
+class RateCounter:
+    # Counts events (ticks, frames) and keeps their rate per second over the
+    # last complete `window` seconds, so it can be read from another thread
+    def __init__(self, window=1.0, clock=time.perf_counter):
+        self.window = window
+        self.clock = clock
+        self.count = 0
+        self.total = 0
+        self.started = self.start = clock()
+        self.rate = 0.0
+
+    def add(self, count=1):
+        self.count += count
+        self.total += count
+        now = self.clock()
+        elapsed = now - self.start
+        if elapsed >= self.window:
+            self.rate = self.count / elapsed
+            self.count = 0
+            self.start = now
+
+    def average(self):
+        # Rate over the whole lifetime of the counter
+        elapsed = self.clock() - self.started
+        return self.total / elapsed if elapsed > 0 else 0.0
+
+class LatencyHistogram:
+    # Counts latencies in `bucket_ms` wide buckets; the last bucket also
+    # holds everything slower than `max_ms`
+    def __init__(self, bucket_ms=2.0, max_ms=200.0):
+        self.bucket_ms = bucket_ms
+        self.counts = [0] * (int(max_ms / bucket_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def add(self, ms):
+        self.counts[min(int(ms / self.bucket_ms), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def percentile(self, q):
+        # Upper edge of the bucket holding the q-th percentile
+        if not self.count:
+            return 0.0
+        rank = self.count * q / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return (i + 1) * self.bucket_ms
+        return len(self.counts) * self.bucket_ms
+
+    def buckets(self):
+        # {bucket upper edge in ms: count}, without the empty buckets
+        return {(i + 1) * self.bucket_ms: count
+                for i, count in enumerate(self.counts) if count}
+
+    def summary(self):
+        return {
+            "inputs": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "histogram": self.buckets(),
+        }
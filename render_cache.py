@@ -0,0 +1,203 @@
+import math
+from collections import OrderedDict
+
+import pygame
+
+# Bounded caches for surfaces that are expensive to build every frame.
+
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.items.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.items),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class PromptSpriteCache:
+    # Rotated, pulsed prompt sprites keyed by
+    # (text, colour, quantized pulse size, quantized rotation angle).
+    def __init__(self, font, text_color, max_size=2048, angle_step=4, pulse_steps=1):
+        self.font = font
+        self.text_color = text_color
+        self.angle_step = angle_step
+        self.pulse_steps = pulse_steps
+        self.sprites = LRUCache(max_size)
+        self.labels = {}  # text -> rendered label, built once per string
+
+    def label(self, text):
+        label = self.labels.get(text)
+        if label is None:
+            label = self.font.render(text, True, self.text_color)
+            self.labels[text] = label
+        return label
+
+    def get(self, text, color, width, height, pulse_size, rotation):
+        # The rect size is truncated to whole pixels, so flooring the pulse
+        # with one step per pixel is exact
+        pulse = math.floor(pulse_size * self.pulse_steps)
+        angle = round(rotation / self.angle_step) % (360 // self.angle_step)
+        key = (text, color, width, height, pulse, angle)
+
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.render(text, color, width, height,
+                                 pulse / self.pulse_steps, angle * self.angle_step)
+            self.sprites.put(key, sprite)
+        return sprite
+
+    def render(self, text, color, width, height, pulse_size, angle):
+        # Create a surface for the prompt
+        surface = pygame.Surface((width + 10, height + 10), pygame.SRCALPHA)
+
+        # Draw the prompt on the surface
+        pygame.draw.rect(surface, color, (5, 5, width + pulse_size, height + pulse_size))
+
+        # Add text
+        label = self.label(text)
+        surface.blit(label, label.get_rect(center=(width/2 + 5, height/2 + 5)))
+
+        # Rotate the surface
+        return pygame.transform.rotate(surface, angle)
+
+    def stats(self):
+        stats = self.sprites.stats()
+        stats["labels"] = len(self.labels)
+        return stats
+
+class ScrollingLayer:
+    # A background layer baked once into a strip twice the view width. The
+    # content repeats every `width` pixels, so any scroll offset is one blit.
+    def __init__(self, width, height, y, draw, fill=None, colorkey=None):
+        self.width = width
+        self.height = height
+        self.y = y
+
+        strip = pygame.Surface((width * 2, height))
+        if colorkey is not None:
+            strip.fill(colorkey)
+            strip.set_colorkey(colorkey, pygame.RLEACCEL)
+        elif fill is not None:
+            strip.fill(fill)
+
+        # Draw the content three times so shapes crossing a seam wrap around
+        for shift in (-width, 0, width):
+            draw(strip, shift)
+
+        if pygame.display.get_surface() is not None:
+            strip = strip.convert()
+        self.surface = strip
+
+    def draw(self, screen, scroll):
+        offset = int(scroll) % self.width
+        return screen.blit(self.surface, (0, self.y), (offset, 0, self.width, self.height))
+
+# Characters pre-rendered into each glyph atlas (numbers in HUD text)
+ATLAS_CHARS = "0123456789.,:-+x% "
+
+class GlyphAtlas:
+    # Every glyph of one font and colour packed side by side in one surface
+    def __init__(self, font, color, chars=ATLAS_CHARS):
+        glyphs = [(char, font.render(char, True, color)) for char in chars]
+        width = sum(glyph.get_width() for _, glyph in glyphs)
+        self.height = max(glyph.get_height() for _, glyph in glyphs)
+        self.surface = pygame.Surface((max(width, 1), self.height), pygame.SRCALPHA)
+        self.areas = {}
+
+        x = 0
+        for char, glyph in glyphs:
+            # RGBA_MAX onto a cleared surface copies the glyph including its alpha
+            self.surface.blit(glyph, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            self.areas[char] = pygame.Rect(x, 0, glyph.get_width(), glyph.get_height())
+            x += glyph.get_width()
+
+    def covers(self, text):
+        areas = self.areas
+        return all(char in areas for char in text)
+
+    def blit(self, screen, text, pos):
+        x, y = pos
+        surface = self.surface
+        areas = self.areas
+        batch = []
+        for char in text:
+            area = areas[char]
+            batch.append((surface, (x, y), area))
+            x += area.width
+        screen.blits(batch, False)
+        return pygame.Rect(pos[0], y, x - pos[0], self.height)
+
+class TextCache:
+    # Memoized text rendering over one font. Whole strings are cached in an
+    # LRU; changing numbers are composed from a per-colour glyph atlas so they
+    # never need fresh font rasterization.
+    def __init__(self, font, max_size=256, max_atlases=8):
+        self.font = font
+        self.texts = LRUCache(max_size)
+        self.atlases = LRUCache(max_atlases)
+
+    def render(self, text, color):
+        key = (text, color)
+        surface = self.texts.get(key)
+        if surface is None:
+            surface = self.font.render(text, True, color)
+            self.texts.put(key, surface)
+        return surface
+
+    def atlas(self, color):
+        atlas = self.atlases.get(color)
+        if atlas is None:
+            atlas = GlyphAtlas(self.font, color)
+            self.atlases.put(color, atlas)
+        return atlas
+
+    def blit(self, screen, text, color, pos=None, center=None):
+        surface = self.render(text, color)
+        if center is not None:
+            return screen.blit(surface, surface.get_rect(center=center))
+        return screen.blit(surface, pos)
+
+    def blit_value(self, screen, prefix, value, color, pos):
+        # Draws a cached static prefix followed by a changing value
+        rect = self.blit(screen, prefix, color, pos)
+        atlas = self.atlas(color)
+        if not atlas.covers(value):
+            return rect.union(self.blit(screen, value, color, rect.topright))
+        return rect.union(atlas.blit(screen, value, rect.topright))
+
+    def stats(self):
+        stats = self.texts.stats()
+        stats["atlases"] = len(self.atlases)
+        return stats
@@ -0,0 +1,212 @@
+import zlib
+
+from simulation import (
+    ACTION_JUMP, ACTION_START, EVENT_GAME_OVER, PLAYING,
+    GameSimulation,
+)
+
+# Input recordings.
+# The simulation is deterministic for a given seed, so a whole session is
+# just the seed plus the tick at which each SPACE/ENTER press was applied.
+# Recordings also store the outcome (every death and the final score) so a
+# replay can prove a score without trusting the file.
+#
+# File layout: MAGIC, version byte, then varints (seed zigzag-encoded):
+#   seed, jump buffer, coyote time (version 2 and later),
+#   reseed runs flag (version 3 and later), end frame, final score,
+#   input count, (tick delta << 1 | action code) per input,
+#   death count, (tick delta, score) per death,
+# followed by the CRC-32 of everything before it (4 bytes, little endian).
+
+MAGIC = b"PRR"
+VERSION = 3
+# Version 1 had no jump buffer or coyote time, version 2 no reseeded runs
+SUPPORTED_VERSIONS = (1, 2, 3)
+
+ACTION_CODES = {ACTION_JUMP: 0, ACTION_START: 1}
+CODE_ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+
+def encode_varint(value, out):
+    # LEB128: 7 bits per byte, high bit set on all but the last byte
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(data, pos):
+    # Returns (value, position after it)
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("truncated recording")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+class Recording:
+    def __init__(self, seed, jump_buffer=0, coyote_time=0, reseed_runs=False):
+        self.seed = seed
+        self.jump_buffer = jump_buffer  # GameSimulation settings the run was played with
+        self.coyote_time = coyote_time
+        self.reseed_runs = reseed_runs
+        self.inputs = []  # (tick, action) in the order they were applied
+        self.deaths = []  # (tick, score) for every game over
+        self.frames = 0
+        self.score = 0
+
+    def record_step(self, frame, inputs, result):
+        # `frame` is sim.frame before the step that applied `inputs`
+        for action in inputs:
+            self.inputs.append((frame, action))
+        if EVENT_GAME_OVER in result.events:
+            self.deaths.append((result.frame, result.score))
+        self.frames = result.frame
+        self.score = result.score
+
+    def to_bytes(self):
+        out = bytearray(MAGIC)
+        out.append(VERSION)
+        for value in (zigzag(self.seed), self.jump_buffer, self.coyote_time,
+                      int(self.reseed_runs), self.frames, self.score, len(self.inputs)):
+            encode_varint(value, out)
+        last = 0
+        for tick, action in self.inputs:
+            encode_varint((tick - last) << 1 | ACTION_CODES[action], out)
+            last = tick
+        encode_varint(len(self.deaths), out)
+        last = 0
+        for tick, score in self.deaths:
+            encode_varint(tick - last, out)
+            encode_varint(score, out)
+            last = tick
+        out += zlib.crc32(out).to_bytes(4, "little")
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a Prompt Runner recording")
+        if len(data) < len(MAGIC) + 5 or data[len(MAGIC)] not in SUPPORTED_VERSIONS:
+            raise ValueError("unsupported recording version")
+        version = data[len(MAGIC)]
+        body, checksum = data[:-4], data[-4:]
+        if zlib.crc32(body).to_bytes(4, "little") != checksum:
+            raise ValueError("recording is corrupt (checksum mismatch)")
+
+        pos = len(MAGIC) + 1
+        seed, pos = decode_varint(body, pos)
+        recording = cls(unzigzag(seed))
+        if version >= 2:
+            recording.jump_buffer, pos = decode_varint(body, pos)
+            recording.coyote_time, pos = decode_varint(body, pos)
+        if version >= 3:
+            reseed_runs, pos = decode_varint(body, pos)
+            recording.reseed_runs = bool(reseed_runs)
+        recording.frames, pos = decode_varint(body, pos)
+        recording.score, pos = decode_varint(body, pos)
+
+        count, pos = decode_varint(body, pos)
+        tick = 0
+        for _ in range(count):
+            value, pos = decode_varint(body, pos)
+            tick += value >> 1
+            recording.inputs.append((tick, CODE_ACTIONS[value & 1]))
+
+        count, pos = decode_varint(body, pos)
+        tick = 0
+        for _ in range(count):
+            delta, pos = decode_varint(body, pos)
+            score, pos = decode_varint(body, pos)
+            tick += delta
+            recording.deaths.append((tick, score))
+        return recording
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+def replay(recording):
+    # Plays the recorded inputs back with no rendering and returns the
+    # outcome as a new Recording. Stretches outside of play (menu, game
+    # over) only scroll the clouds, so they are skipped in a single step.
+    sim = GameSimulation(seed=recording.seed, effects=False,
+                         jump_buffer=recording.jump_buffer, coyote_time=recording.coyote_time,
+                         reseed_runs=recording.reseed_runs)
+    result = sim.result()
+    replayed = Recording(recording.seed, recording.jump_buffer, recording.coyote_time,
+                         recording.reseed_runs)
+    inputs = recording.inputs
+    i = 0
+
+    while sim.frame < recording.frames:
+        frame = sim.frame
+        actions = []
+        while i < len(inputs) and inputs[i][0] == frame:
+            actions.append(inputs[i][1])
+            i += 1
+        if i < len(inputs) and inputs[i][0] < frame:
+            raise ValueError(f"input at tick {inputs[i][0]} is out of order")
+
+        if not actions and sim.state != PLAYING:
+            next_tick = inputs[i][0] if i < len(inputs) else recording.frames
+            result = sim.step((), min(next_tick, recording.frames) - frame)
+        else:
+            result = sim.step(actions)
+        replayed.record_step(frame, actions, result)
+    return replayed
+
+def verify(recording):
+    # Replays `recording` and returns a list of differences (empty if the
+    # recorded outcome is exactly what its inputs produce)
+    replayed = replay(recording)
+    problems = []
+    if replayed.score != recording.score:
+        problems.append(f"final score {replayed.score}, recording claims {recording.score}")
+    if replayed.deaths != recording.deaths:
+        for i in range(max(len(replayed.deaths), len(recording.deaths))):
+            actual = replayed.deaths[i] if i < len(replayed.deaths) else None
+            claimed = recording.deaths[i] if i < len(recording.deaths) else None
+            if actual != claimed:
+                problems.append(f"death {i + 1} (tick, score) is {actual}, "
+                                f"recording claims {claimed}")
+                break
+    return problems
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    import time
+
+    parser = argparse.ArgumentParser(description="Verify a Prompt Runner recording")
+    parser.add_argument("recording")
+    args = parser.parse_args()
+
+    recording = Recording.load(args.recording)
+    start = time.perf_counter()
+    problems = verify(recording)
+    elapsed = time.perf_counter() - start
+
+    print(f"Seed {recording.seed}: {recording.frames} ticks, {len(recording.inputs)} inputs, "
+          f"{len(recording.deaths)} deaths, final score {recording.score}")
+    print(f"Replayed in {elapsed * 1000:.1f} ms")
+    if problems:
+        print("MISMATCH:")
+        for problem in problems:
+            print(f"    {problem}")
+        sys.exit(1)
+    print("Recording verified")
@@ -0,0 +1,107 @@
+import pygame
+
+# Resolution-independent presentation.
+# The game draws everything onto `canvas`, an off-screen surface at a fixed
+# internal resolution, and each frame is scaled to the window in one pass.
+# Drawing costs the same whatever the window size, so the game can run
+# fullscreen on a large display without rendering every primitive at its
+# native resolution.
+
+FIT = "fit"          # largest size that keeps the aspect ratio, letterboxed
+INTEGER = "integer"  # largest whole multiple of the canvas, for crisp pixels
+SCALE_MODES = (FIT, INTEGER)
+
+BORDER_COLOR = (0, 0, 0)
+
+MOUSE_EVENTS = (pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP)
+
+def scaled_rect(size, window_size, mode=FIT):
+    # Where a canvas of `size` goes in a window of `window_size`, centred.
+    # Integer mode falls back to fit when the window is smaller than the canvas.
+    width, height = size
+    window_width, window_height = window_size
+    scale = min(window_width / width, window_height / height)
+    if mode == INTEGER and scale >= 1:
+        scale = int(scale)
+    scaled_width = min(window_width, round(width * scale))
+    scaled_height = min(window_height, round(height * scale))
+    return pygame.Rect((window_width - scaled_width) // 2, (window_height - scaled_height) // 2,
+                       scaled_width, scaled_height)
+
+class ScaledDisplay:
+    # Stands in for the pygame.display module: flip() and update(rects) show
+    # the canvas in the window, with rects in canvas coordinates. Without a
+    # window size the window starts at the canvas size; it can be resized.
+    def __init__(self, size, window_size=None, fullscreen=False, mode=FIT, smooth=False):
+        self.size = tuple(size)
+        self.mode = mode
+        self.smooth = smooth  # filtered scaling in fit mode (integer mode is always sharp)
+        if fullscreen:
+            pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        else:
+            pygame.display.set_mode(window_size or self.size, pygame.RESIZABLE)
+        self.canvas = pygame.Surface(self.size).convert()
+        self.resize()
+
+    def resize(self):
+        # Lays the canvas out in the current window; called on every resize
+        self.window = pygame.display.get_surface()
+        self.dest = scaled_rect(self.size, self.window.get_size(), self.mode)
+        self.scale_x = self.dest.width / self.size[0]
+        self.scale_y = self.dest.height / self.size[1]
+        factor = self.dest.width // self.size[0]
+        self.factor = factor if factor and self.dest.size == (self.size[0] * factor,
+                                                              self.size[1] * factor) else 0
+        self.stale = True  # the borders need clearing and the whole canvas showing
+
+    def flip(self):
+        if self.stale:
+            self.window.fill(BORDER_COLOR)
+            self.stale = False
+        target = self.window.subsurface(self.dest)
+        if self.factor == 1:
+            target.blit(self.canvas, (0, 0))
+        elif self.smooth and not self.factor:
+            pygame.transform.smoothscale(self.canvas, self.dest.size, target)
+        else:
+            pygame.transform.scale(self.canvas, self.dest.size, target)
+        pygame.display.flip()
+
+    def update(self, rects):
+        # Only whole-number scales map canvas pixels exactly onto window
+        # pixels, so other scales show the whole canvas. So do rects that
+        # add up to more than the canvas: scaling it once is cheaper.
+        if (self.stale or not self.factor
+                or sum(rect.width * rect.height for rect in rects) >= self.size[0] * self.size[1]):
+            self.flip()
+            return
+        factor = self.factor
+        updated = []
+        for rect in rects:
+            target = pygame.Rect(self.dest.x + rect.x * factor, self.dest.y + rect.y * factor,
+                                 rect.width * factor, rect.height * factor)
+            pygame.transform.scale(self.canvas.subsurface(rect), target.size,
+                                   self.window.subsurface(target))
+            updated.append(target)
+        pygame.display.update(updated)
+
+    def to_canvas(self, pos):
+        # Window position to canvas position (outside the canvas in the borders)
+        return (int((pos[0] - self.dest.x) // self.scale_x),
+                int((pos[1] - self.dest.y) // self.scale_y))
+
+    def remap_event(self, event):
+        # Returns `event` with mouse positions in canvas coordinates, and
+        # follows window size changes
+        if event.type == pygame.VIDEORESIZE:
+            self.resize()
+        elif event.type == pygame.WINDOWEXPOSED:
+            self.stale = True
+        elif event.type in MOUSE_EVENTS:
+            attributes = dict(event.dict)
+            attributes["pos"] = self.to_canvas(event.pos)
+            if "rel" in attributes:
+                attributes["rel"] = (round(event.rel[0] / self.scale_x),
+                                     round(event.rel[1] / self.scale_y))
+            return pygame.event.Event(event.type, attributes)
+        return event
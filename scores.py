@@ -0,0 +1,211 @@
+import os
+import heapq
+import queue
+import sqlite3
+import threading
+from collections import namedtuple
+
+# High scores and run history.
+# Every finished run is stored in a local SQLite database in WAL mode, so the
+# leaderboard can be read while runs are being written. Writes are queued and
+# committed in batches on a background thread; the game loop never waits for
+# the disk. Runs that are still queued are merged into query results, so a
+# run shows up on the leaderboard as soon as it is recorded.
+
+SCORES_FILE = os.environ.get("PROMPT_RUNNER_SCORES",
+                             os.path.join(os.path.expanduser("~"), ".local", "share",
+                                          "prompt_runner", "scores.db"))
+
+DEFAULT_PLAYER = "Player"
+
+# `duration` is seconds of play and `finished_at` a Unix timestamp
+Run = namedtuple("Run", ("player", "score", "duration", "max_speed", "prompts_collected",
+                         "seed", "finished_at"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    max_speed REAL NOT NULL,
+    prompts_collected INTEGER NOT NULL,
+    seed INTEGER,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_score ON runs (score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_player_score ON runs (player, score DESC);
+
+-- One row per player, kept up to date with every insert, so the player
+-- leaderboard never has to group millions of runs
+CREATE TABLE IF NOT EXISTS players (
+    player TEXT PRIMARY KEY,
+    best_score INTEGER NOT NULL,
+    runs INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_by_best ON players (best_score DESC);
+"""
+
+INSERT_RUN = ("INSERT INTO runs (player, score, duration, max_speed, prompts_collected, "
+              "seed, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?)")
+UPDATE_PLAYER = ("INSERT INTO players (player, best_score, runs) VALUES (?, ?, 1) "
+                 "ON CONFLICT (player) DO UPDATE SET "
+                 "best_score = max(best_score, excluded.best_score), runs = runs + 1")
+
+RUN_COLUMNS = "player, score, duration, max_speed, prompts_collected, seed, finished_at"
+TOP_RUNS = f"SELECT {RUN_COLUMNS} FROM runs ORDER BY score DESC LIMIT ?"
+TOP_PLAYER_RUNS = f"SELECT {RUN_COLUMNS} FROM runs WHERE player = ? ORDER BY score DESC LIMIT ?"
+TOP_PLAYERS = "SELECT player, best_score, runs FROM players ORDER BY best_score DESC LIMIT ?"
+PLAYER = "SELECT player, best_score, runs FROM players WHERE player = ?"
+LAST_ID = "SELECT max(id) FROM runs"
+
+def score(run):
+    return run.score
+
+def connect(path):
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode = WAL")
+    # In WAL mode this only syncs at checkpoints; a crash can lose the last
+    # few runs but never corrupts the database
+    connection.execute("PRAGMA synchronous = NORMAL")
+    return connection
+
+class ScoreStore:
+    # record() may be called from any thread; queries run on the caller's
+    # thread with their own connection. close() writes out what is queued.
+    def __init__(self, path=SCORES_FILE, batch_size=256):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.reader = connect(path)
+        self.reader.executescript(SCHEMA)
+        self.lock = threading.Lock()  # guards `unsaved`; never held during disk writes
+        self.read_lock = threading.Lock()  # serializes use of `reader`
+        # id(run) -> (run, last row id of its batch once inserted), for runs
+        # queued but not known to be committed
+        self.unsaved = {}
+        self.failed = 0  # runs lost to write errors
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="scores", daemon=True)
+        self.thread.start()
+
+    def record(self, run):
+        with self.lock:
+            self.unsaved[id(run)] = (run, None)
+        self.queue.put(run)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.reader.close()
+
+    def _begin_read(self):
+        # Starts a read transaction on `reader` and returns the queued runs
+        # its snapshot does not contain. Row ids only grow and a batch is
+        # committed all at once, so a batch is in the snapshot exactly when
+        # its last row id is. Only the snapshot itself is taken under the
+        # lock; the writer never holds it while committing.
+        self.reader.execute("BEGIN")
+        with self.lock:
+            last_id = self.reader.execute(LAST_ID).fetchone()[0] or 0
+            return [run for run, run_id in self.unsaved.values()
+                    if run_id is None or run_id > last_id]
+
+    def top_runs(self, limit=10, player=None):
+        # Best runs overall, or of one player, highest score first
+        with self.read_lock:
+            unsaved = self._begin_read()
+            try:
+                if player is None:
+                    runs = [Run(*row) for row in self.reader.execute(TOP_RUNS, (limit,))]
+                    runs += heapq.nlargest(limit, unsaved, key=score)
+                else:
+                    runs = [Run(*row) for row in self.reader.execute(TOP_PLAYER_RUNS,
+                                                                     (player, limit))]
+                    runs += [run for run in unsaved if run.player == player]
+            finally:
+                self.reader.commit()
+        runs.sort(key=score, reverse=True)
+        return runs[:limit]
+
+    def top_players(self, limit=10):
+        # (player, best score, number of runs) for the best players
+        with self.read_lock:
+            unsaved = self._begin_read()
+            try:
+                players = {row[0]: list(row[1:])
+                           for row in self.reader.execute(TOP_PLAYERS, (limit,))}
+                for run in unsaved:
+                    entry = players.get(run.player)
+                    if entry is None:
+                        row = self.reader.execute(PLAYER, (run.player,)).fetchone()
+                        entry = players[run.player] = list(row[1:]) if row else [run.score, 0]
+                    entry[0] = max(entry[0], run.score)
+                    entry[1] += 1
+            finally:
+                self.reader.commit()
+        ranked = sorted(players.items(), key=lambda item: -item[1][0])[:limit]
+        return [(player, best, runs) for player, (best, runs) in ranked]
+
+    def player_stats(self, player):
+        # (best score, number of runs) of one player, or None before their first run
+        with self.read_lock:
+            unsaved = self._begin_read()
+            try:
+                row = self.reader.execute(PLAYER, (player,)).fetchone()
+            finally:
+                self.reader.commit()
+        best, runs = row[1:] if row else (None, 0)
+        for run in unsaved:
+            if run.player == player:
+                best = run.score if best is None else max(best, run.score)
+                runs += 1
+        return (best, runs) if runs else None
+
+    def _run(self):
+        connection = connect(self.path)
+        done = False
+        while not done:
+            # Block for the first run, then take whatever else is queued
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                done = True
+                batch = [run for run in batch if run is not None]
+            if batch:
+                self._write(connection, batch)
+        connection.close()
+
+    def _write(self, connection, batch):
+        error = None
+        try:
+            connection.executemany(INSERT_RUN, batch)
+            connection.executemany(UPDATE_PLAYER, [(run.player, run.score) for run in batch])
+            last_id = connection.execute(LAST_ID).fetchone()[0]
+        except sqlite3.Error as exc:
+            error = exc
+
+        if error is None:
+            # Tag the runs with their batch before committing, so queries can
+            # tell whether their snapshot already has them
+            with self.lock:
+                for run in batch:
+                    self.unsaved[id(run)] = (run, last_id)
+            try:
+                connection.commit()
+            except sqlite3.Error as exc:
+                error = exc
+        if error is not None:
+            connection.rollback()
+
+        with self.lock:
+            for run in batch:
+                del self.unsaved[id(run)]
+
+        if error is not None:
+            self.failed += len(batch)
+            print(f"Could not save {len(batch)} runs: {error}")
@@ -0,0 +1,420 @@
+import random
+
+from collision import find_collisions
+from particles import ParticleSystem, PARTICLE_CAPACITY
+from pools import GCMonitor, ObjectPool
+
+# Headless game rules for Prompt Runner.
+# Nothing in this module touches pygame, so it can be imported and stepped
+# thousands of times per second without a display (balancing, tests, bots).
+# All speeds are per tick; the game runs FPS ticks per second.
+
+# World constants
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+GROUND_HEIGHT = 50
+GRAVITY = 0.6
+JUMP_FORCE = -15
+PROMPT_SPEED = 5
+PROMPT_SPAWN_RATE = 60  # Frames between prompt spawns
+GAME_SPEED_INCREASE = 0.0001  # How much to increase speed per frame
+CLOUD_SPEED = 1
+CLOUD_LAYER_SPEEDS = (0.5, 1.0)  # Parallax layers, as multiples of CLOUD_SPEED
+FPS = 60  # Simulation ticks per second
+PARTICLES_PER_BURST = 15
+PROMPT_WIDTH = 80
+PROMPT_HEIGHT = 40
+
+GOOD_TEXTS = ["Good!", "Nice!", "Great!"]
+BAD_TEXTS = ["Bad!", "Wrong!", "Avoid!"]
+
+# Game states
+MENU = 0
+PLAYING = 1
+GAME_OVER = 2
+
+# Inputs accepted by GameSimulation.step()
+ACTION_JUMP = "jump"
+ACTION_START = "start"
+
+# Events reported by GameSimulation.step()
+EVENT_JUMP = "jump"
+EVENT_GOOD_COLLECT = "good_collect"
+EVENT_BAD_COLLECT = "bad_collect"
+EVENT_GAME_OVER = "game_over"
+
+class Player:
+    def __init__(self):
+        self.width = 50
+        self.height = 80
+        self.x = 100
+        self.y = SCREEN_HEIGHT - GROUND_HEIGHT - self.height
+        self.prev_y = self.y  # position one tick earlier, for render interpolation
+        self.vel_y = 0
+        self.is_jumping = False
+        self.air_ticks = 0  # ticks since the player last stood on the ground
+        self.animation_frame = 0
+        self.animation_speed = 0.2
+
+    def update(self):
+        self.prev_y = self.y
+
+        # Apply gravity
+        self.vel_y += GRAVITY
+        self.y += self.vel_y
+
+        # Check for ground collision
+        if self.y > SCREEN_HEIGHT - GROUND_HEIGHT - self.height:
+            self.y = SCREEN_HEIGHT - GROUND_HEIGHT - self.height
+            self.vel_y = 0
+            self.is_jumping = False
+            self.air_ticks = 0
+        else:
+            self.air_ticks += 1
+
+        # Update animation frame
+        self.animation_frame += self.animation_speed
+        if self.animation_frame >= 4:
+            self.animation_frame = 0
+
+    def jump(self, coyote_time=0):
+        # Returns True when the jump actually started. A player who is in the
+        # air without having jumped may still jump for `coyote_time` ticks.
+        if not self.is_jumping and self.air_ticks <= coyote_time:
+            self.vel_y = JUMP_FORCE
+            self.is_jumping = True
+            return True
+        return False
+
+class Prompt:
+    __slots__ = ("width", "height", "x", "prev_x", "y", "is_good", "speed", "text",
+                 "rotation", "rotation_speed", "pulse_size", "pulse_direction")
+
+    def __init__(self, x, is_good, rng):
+        self.reset(x, is_good, rng)
+
+    def reset(self, x, is_good, rng):
+        # Also used to recycle a retired prompt from the pool
+        self.width = PROMPT_WIDTH
+        self.height = PROMPT_HEIGHT
+        self.x = x
+        self.prev_x = x
+        self.y = rng.randint(100, SCREEN_HEIGHT - GROUND_HEIGHT - 100)
+        self.is_good = is_good
+        self.speed = PROMPT_SPEED
+        self.text = rng.choice(GOOD_TEXTS if is_good else BAD_TEXTS)
+        self.rotation = 0
+        self.rotation_speed = rng.uniform(-2, 2)
+        self.pulse_size = 0
+        self.pulse_direction = 1
+
+    def move(self, game_speed):
+        # One tick of motion
+        self.prev_x = self.x
+        self.x -= self.speed * game_speed
+
+    def animate(self, dt=1):
+        # Spin and pulse; cosmetic, so coarse steps advance it in one go
+        self.rotation += self.rotation_speed * dt
+
+        # Pulsing effect
+        self.pulse_size += 0.1 * self.pulse_direction * dt
+        if self.pulse_size > 1 or self.pulse_size < 0:
+            self.pulse_direction *= -1
+
+class Cloud:
+    # Clouds sit at fixed spots on a strip SCREEN_WIDTH wide that loops
+    # forever; the strip scrolls at CLOUD_SPEED * speed for parallax
+    __slots__ = ("x", "y", "speed", "width", "height")
+
+    def __init__(self, rng):
+        self.x = rng.randint(0, SCREEN_WIDTH - 1)
+        self.y = rng.randint(50, 200)
+        self.speed = rng.choice(CLOUD_LAYER_SPEEDS)
+        self.width = rng.randint(60, 120)
+        self.height = rng.randint(30, 60)
+
+    def screen_x(self, cloud_scroll):
+        return (self.x - cloud_scroll * self.speed) % SCREEN_WIDTH
+
+class StepResult:
+    __slots__ = ("state", "score", "game_speed", "frame", "events")
+
+    def __init__(self, state, score, game_speed, frame, events):
+        self.state = state
+        self.score = score
+        self.game_speed = game_speed
+        self.frame = frame
+        self.events = events
+
+class GameSimulation:
+    # Deterministic game engine. Gameplay randomness (prompt spawns) comes from
+    # `rng`; purely cosmetic randomness (clouds, particles) comes from `fx_rng`
+    # so visual settings never change the outcome of a seeded run.
+    # `jump_buffer` (ticks) keeps a jump pressed while still in the air and
+    # starts it as soon as the player can jump; `coyote_time` (ticks) is the
+    # grace period for Player.jump(). With `reseed_runs` every run starts the
+    # prompt stream over from `seed`, so all runs (and all players of a ghost
+    # race) face the same prompts. These change the outcome of a run, so
+    # recordings store them.
+    def __init__(self, seed=None, effects=True, num_clouds=8, jump_buffer=0, coyote_time=0,
+                 reseed_runs=False):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.effects = effects
+        self.rng = random.Random(seed)
+        self.fx_rng = random.Random(seed ^ 0x5EED)
+        self.state = MENU
+        self.frame = 0
+        self.prompt_pool = ObjectPool(Prompt)
+        self.prompts = []
+        self.cloud_scroll = 0.0
+        self.ground_scroll = 0.0
+        self.prev_cloud_scroll = 0.0
+        self.prev_ground_scroll = 0.0
+        self.clouds = [Cloud(self.fx_rng) for _ in range(num_clouds)] if effects else []
+        self.particles = ParticleSystem(PARTICLE_CAPACITY if effects else 0,
+                                        seed=self.fx_rng.randrange(2 ** 32))
+        self.timer = None  # optional profiling.PhaseTimer
+        self.gc_monitor = None  # optional pools.GCMonitor, reported by stats()
+        self.particles_per_burst = PARTICLES_PER_BURST  # lowered by the quality governor
+        self.jump_buffer = jump_buffer
+        self.coyote_time = coyote_time
+        self.reseed_runs = reseed_runs
+        self.reset()
+
+    def reset(self):
+        self.player = Player()
+        self.prompt_pool.release_all(self.prompts)
+        self.prompts = []
+        self.particles.clear()
+        self.score = 0
+        self.spawn_counter = 0
+        self.game_speed = 1.0
+        self.play_frame = 0
+        self.buffered_jump = 0  # ticks left to retry an early jump press
+
+    def start(self):
+        self.reset()
+        if self.reseed_runs:
+            self.rng.seed(self.seed)
+        self.state = PLAYING
+
+    def step(self, inputs=(), dt=1):
+        # Advances the game by `dt` ticks, with `inputs` applied on the first.
+        # A coarse step (dt > 1) gives exactly the same events, score and
+        # deaths as `dt` single steps; it only saves the per-step overhead
+        # and advances cosmetic effects in one go.
+        events = []
+
+        if self.state == PLAYING:
+            self._retry_jump(events)
+
+        for action in inputs:
+            if action == ACTION_START:
+                if self.state != PLAYING:
+                    self.start()
+            elif action == ACTION_JUMP:
+                if self.state == PLAYING:
+                    if self.player.jump(self.coyote_time):
+                        events.append(EVENT_JUMP)
+                    else:
+                        self.buffered_jump = self.jump_buffer
+
+        # Clouds drift in all game states
+        self.prev_cloud_scroll = self.cloud_scroll
+        self.prev_ground_scroll = self.ground_scroll
+        self.cloud_scroll += CLOUD_SPEED * dt
+
+        if self.state == PLAYING:
+            self._update_playing(events, dt)
+
+        self.frame += dt
+        return self.result(events)
+
+    def result(self, events=()):
+        return StepResult(self.state, self.score, self.game_speed, self.frame, events)
+
+    def _retry_jump(self, events):
+        # Starts a buffered jump as soon as the player can jump
+        if self.buffered_jump:
+            if self.player.jump(self.coyote_time):
+                events.append(EVENT_JUMP)
+                self.buffered_jump = 0
+            else:
+                self.buffered_jump -= 1
+
+    def _update_playing(self, events, dt):
+        # Gameplay runs one tick at a time even in a coarse step: the player
+        # falls along a curve, and sweeping a whole step in a straight line
+        # can miss prompts the single ticks would hit. Play stops on the tick
+        # the player dies, as it would with single steps.
+        timer = self.timer
+        if timer is not None:
+            timer.begin()
+        player = self.player
+        prompts = self.prompts
+
+        for tick in range(dt):
+            if tick:
+                self._retry_jump(events)
+            self.play_frame += 1
+
+            # Update game speed
+            self.game_speed += GAME_SPEED_INCREASE
+            game_speed = self.game_speed
+            distance = PROMPT_SPEED * game_speed
+            self.ground_scroll += distance
+
+            # Update player
+            player.update()
+            if timer is not None:
+                timer.lap("player_update")
+
+            # Spawn prompts
+            self.spawn_counter += 1
+            if self.spawn_counter >= PROMPT_SPAWN_RATE / game_speed:
+                self.spawn_counter = 0
+                is_good = self.rng.choice([True, False])
+                prompts.append(self.prompt_pool.acquire(SCREEN_WIDTH, is_good, self.rng))
+
+            # Move prompts
+            for prompt in prompts:
+                prompt.move(game_speed)
+            if timer is not None:
+                timer.lap("prompt_update")
+
+            # Check for collisions, only against prompts whose path this tick
+            # crosses the player's x-range
+            hits = find_collisions(player, prompts, PROMPT_WIDTH, distance)
+            for i in hits:
+                prompt = prompts[i]
+                if prompt.is_good:
+                    self.score += 10
+                    events.append(EVENT_GOOD_COLLECT)
+                else:
+                    events.append(EVENT_BAD_COLLECT)
+                    if self.state != GAME_OVER:
+                        events.append(EVENT_GAME_OVER)
+                    self.state = GAME_OVER
+                self.emit_particles(prompt.x + prompt.width / 2,
+                                    prompt.y + prompt.height / 2, prompt.is_good)
+            # Hits are removed in place (not swap-and-pop) to keep the list
+            # sorted by x for the broadphase; there are rarely more than one
+            for i in reversed(hits):
+                self.prompt_pool.release(prompts.pop(i))
+            if timer is not None:
+                timer.lap("collision")
+            if self.state == GAME_OVER:
+                break
+
+        for prompt in prompts:
+            prompt.animate(dt)
+
+        # Remove prompts that are off-screen; the list is sorted by x, so
+        # they are always at the front
+        offscreen = 0
+        while offscreen < len(prompts) and prompts[offscreen].x + prompts[offscreen].width < 0:
+            offscreen += 1
+        if offscreen:
+            self.prompt_pool.release_all(prompts[:offscreen])
+            del prompts[:offscreen]
+        if timer is not None:
+            timer.lap("collision")
+
+        # Update particles
+        self.particles.update(dt)
+        if timer is not None:
+            timer.lap("particle_update")
+
+    def emit_particles(self, x, y, is_good, count=None):
+        if self.effects:
+            if count is None:
+                count = self.particles_per_burst
+            self.particles.emit(x, y, is_good, count)
+
+    def stats(self):
+        stats = {
+            "prompts": len(self.prompts),
+            "particles": len(self.particles),
+            "particles_dropped": self.particles.dropped,
+            "prompt_pool": self.prompt_pool.stats(),
+        }
+        if self.gc_monitor is not None:
+            stats["gc"] = self.gc_monitor.stats()
+        return stats
+
+def run_headless(frames, seed=0, jump_every=0, dt=1):
+    # Plays `frames` ticks with a trivial scripted bot, `dt` ticks per step,
+    # and returns the simulation plus the measured ticks per second.
+    import time
+
+    sim = GameSimulation(seed=seed, effects=False)
+    sim.step([ACTION_START])
+    start = time.perf_counter()
+    for frame in range(0, frames, dt):
+        inputs = ()
+        if sim.state == GAME_OVER:
+            inputs = (ACTION_START,)
+        elif jump_every and frame % jump_every < dt:
+            inputs = (ACTION_JUMP,)
+        sim.step(inputs, dt)
+    elapsed = time.perf_counter() - start
+    return sim, frames / elapsed if elapsed > 0 else float("inf")
+
+def verify_coarse_steps(seeds, frames, dt, jump_every=45):
+    # Plays each seed with steps of `dt` ticks and with single steps, given
+    # the same inputs, and returns the seeds whose events, score, state or
+    # player position ever differ (none if coarse steps are exact)
+    mismatched = []
+    for seed in seeds:
+        coarse = GameSimulation(seed=seed, effects=False, jump_buffer=6)
+        single = GameSimulation(seed=seed, effects=False, jump_buffer=6)
+        for frame in range(0, frames, dt):
+            inputs = ()
+            if coarse.state != PLAYING:
+                inputs = (ACTION_START,)
+            elif (frame + seed * 7) % jump_every < dt:
+                inputs = (ACTION_JUMP,)
+            events = coarse.step(inputs, dt).events
+            single_events = list(single.step(inputs).events)
+            for _ in range(dt - 1):
+                single_events += single.step().events
+            if (events != single_events or coarse.score != single.score
+                    or coarse.state != single.state or coarse.play_frame != single.play_frame
+                    or coarse.player.y != single.player.y):
+                mismatched.append(seed)
+                break
+    return mismatched
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run Prompt Runner headless")
+    parser.add_argument("--frames", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jump-every", type=int, default=45)
+    parser.add_argument("--dt", type=int, default=1, help="ticks per simulation step")
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="check that N seeds play out the same with --dt steps "
+                             "as with single steps, then exit")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatched = verify_coarse_steps(range(args.seed, args.seed + args.verify),
+                                         min(args.frames, 5000), args.dt, args.jump_every)
+        if mismatched:
+            print(f"{len(mismatched)} of {args.verify} seeds differ with dt={args.dt}: "
+                  f"{mismatched[:10]}")
+            raise SystemExit(1)
+        print(f"All {args.verify} seeds match single steps with dt={args.dt}")
+        raise SystemExit(0)
+
+    gc_monitor = GCMonitor().install()
+    sim, fps = run_headless(args.frames, args.seed, args.jump_every, args.dt)
+    gc_monitor.uninstall()
+    print(f"Simulated {args.frames} frames at {fps:,.0f} frames/s "
+          f"(seed={args.seed}, dt={args.dt}, score={sim.score})")
+    print(f"Prompt pool: {sim.prompt_pool.stats()}")
+    print(f"GC: {gc_monitor.stats()}")
@@ -0,0 +1,58 @@
+import time
+
+from simulation import FPS
+
+# Fixed-timestep accumulator.
+# The simulation always advances in ticks of 1 / tick_rate seconds, however
+# fast or slow frames are rendered. Renderers draw between the last two
+# ticks using `alpha`, and a slow frame runs at most `max_catch_up` ticks so
+# a stall never turns into a spiral of ever-longer frames.
+
+class FixedTimestep:
+    def __init__(self, tick_rate=FPS, max_catch_up=5, clock=time.perf_counter):
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.accumulator = 0.0
+        self.last_time = None
+        self.ticks = 0
+        self.dropped_ticks = 0  # ticks skipped because a frame fell too far behind
+
+    def reset(self):
+        # Forget elapsed time, e.g. after a blocking transition
+        self.accumulator = 0.0
+        self.last_time = None
+
+    def advance(self):
+        # Returns how many simulation ticks to run for this rendered frame
+        now = self.clock()
+        if self.last_time is None:
+            self.last_time = now
+            return 0
+        self.accumulator += now - self.last_time
+        self.last_time = now
+
+        ticks = int(self.accumulator / self.dt)
+        if ticks > self.max_catch_up:
+            self.dropped_ticks += ticks - self.max_catch_up
+            ticks = self.max_catch_up
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= ticks * self.dt
+        self.ticks += ticks
+        return ticks
+
+    def tick_times(self, ticks):
+        # The moment each of the `ticks` just returned by advance() stands for,
+        # oldest first; the newest is `accumulator` seconds before now
+        newest = self.last_time - self.accumulator
+        return [newest - (ticks - 1 - i) * self.dt for i in range(ticks)]
+
+    @property
+    def alpha(self):
+        # Fraction of the way from the previous tick to the current one
+        return min(self.accumulator / self.dt, 1.0)
+
+def lerp(previous, current, alpha):
+    return previous + (current - previous) * alpha